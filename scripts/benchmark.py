@@ -0,0 +1,322 @@
+import os
+import io
+import re
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import itertools
+import subprocess
+import contextlib
+from pathlib import Path
+import numpy as np
+
+import precice_nozzle_generator as gen
+
+"""
+benchmark.py
+
+Times and memory-profiles the generator stages on synthetic GMSH 4.1 nozzle meshes, so
+parsing and conversion regressions show up before they reach production-size meshes.
+
+    python3 scripts/benchmark.py --sizes 10k,100k,1M --output bench.json
+    python3 scripts/benchmark.py --sizes 10k,100k,1M --compare bench.json
+
+The synthetic meshes are annular tetrahedral sectors with a converging-diverging bore,
+cooling channels cut through the wall and the physical groups of the real solid mesh
+(Nozzle_Outer_Wall_N, Nozzle_Inner_Wall, Cooling_Channel_N_*_Wall, ...). Every stage is
+run once under tracemalloc for its peak allocation, then timed over --repeat runs (best
+run reported). Results are written as JSON, one record per mesh size.
+"""
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+STAGES = ('parse_physical_names', 'parse_gmsh_mesh_v4', 'write_calculix_inp', 'build_polymesh',
+          'mesh_quality', 'write_openfoam_polymesh', 'render_templates', 'validate_generated_project')
+
+def parse_size(text):
+    """'10k' -> 10000, '2.5M' -> 2500000."""
+    m = re.fullmatch(r'([\d.]+)([kKmM]?)', text.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"invalid mesh size: {text}")
+    return int(float(m.group(1)) * {'': 1, 'k': 10**3, 'm': 10**6}[m.group(2).lower()])
+
+def inner_radius(x, length):
+    """Converging-diverging bore of the synthetic nozzle, throat at 40% of the length."""
+    t = x / length - 0.4
+    return 0.1 + np.where(t < 0, 0.6 * t * t, 0.4 * t * t)
+
+def _lattice_shape(n_elements, n_channels):
+    """(nr, nt) cells through the wall and around the sector for about n_elements tetrahedra
+    (6 per cell) with roughly equal cell edge lengths on the default nozzle."""
+    s = (n_elements / (6 * 66)) ** (1 / 3)
+    return max(3, round(s)), max(2 * n_channels + 1, round(2 * s))
+
+def synthesize_nozzle_mesh(n_elements, n_channels=3, n_wall_segments=4, sector_deg=18.0, length=1.0, thickness=0.03):
+    """Build a first-order tetrahedral nozzle wall sector of about n_elements tetrahedra.
+
+    The wall is a structured (x, r, theta) lattice split into 6 Kuhn tetrahedra per cell,
+    which makes the triangulation conforming with every quad face split along its
+    min-to-max diagonal. Returns a mesh dict in the layout of load_mesh.
+    """
+    nr, nt = _lattice_shape(n_elements, n_channels)
+
+    # Cooling channels: holes through the middle of the wall, running the whole length
+    j0, j1 = nr // 3, nr - nr // 3
+    width = max(1, nt // (3 * n_channels))
+    channels = []
+    for c in range(n_channels):
+        k0 = int((c + 0.5) * nt / n_channels) - width // 2
+        channels.append((max(k0, 1), min(k0 + width, nt - 1)))
+    hole = np.zeros((nr, nt), dtype=bool)
+    for k0, k1 in channels:
+        hole[j0:j1, k0:k1] = True
+    nx = max(4, round(n_elements / (6 * np.count_nonzero(~hole))))
+    stride = np.array([(nr + 1) * (nt + 1), nt + 1, 1])
+    node_id = lambda i, j, k: i * stride[0] + j * stride[1] + k
+
+    # Solid cells and their 6 tetrahedra, one per permutation of the axes
+    i, j, k = np.meshgrid(np.arange(nx), np.arange(nr), np.arange(nt), indexing='ij')
+    solid = ~hole[j, k]
+    base = node_id(i[solid], j[solid], k[solid]).astype(np.int64)
+    tets = []
+    for perm in itertools.permutations(range(3)):
+        offsets = np.concatenate(([0], np.cumsum(stride[list(perm)])))
+        tet = base[:, None] + offsets
+        # (x, r, theta) -> (x, y, z) preserves orientation, so odd permutations are inverted
+        parity = sum(perm[a] > perm[b] for a in range(3) for b in range(a + 1, 3)) % 2
+        tets.append(tet[:, [0, 1, 3, 2]] if parity else tet)
+    tets = np.concatenate(tets)
+
+    def quads(axis, fixed, a_range, b_range):
+        """Triangles of the lattice quads normal to axis at index fixed, over the two free
+        axes (in increasing order) spanning a_range x b_range."""
+        a_axis, b_axis = [d for d in range(3) if d != axis]
+        a, b = np.meshgrid(np.asarray(a_range), np.asarray(b_range), indexing='ij')
+        corner = [None] * 3
+        corner[axis], corner[a_axis], corner[b_axis] = fixed, a.ravel(), b.ravel()
+        p00 = node_id(*corner).astype(np.int64)
+        p10, p01 = p00 + stride[a_axis], p00 + stride[b_axis]
+        p11 = p10 + stride[b_axis]
+        return np.concatenate((np.stack([p00, p10, p11], 1), np.stack([p00, p11, p01], 1)))
+
+    def axial_plane(fixed):
+        """Triangles of the quads at x index fixed, leaving the channel openings out."""
+        j_open, k_open = np.nonzero(~hole)
+        p00 = node_id(fixed, j_open, k_open).astype(np.int64)
+        p10, p01 = p00 + stride[1], p00 + stride[2]
+        p11 = p10 + stride[2]
+        return np.concatenate((np.stack([p00, p10, p11], 1), np.stack([p00, p11, p01], 1)))
+
+    all_i, all_j, all_k = np.arange(nx), np.arange(nr), np.arange(nt)
+    groups = [('Nozzle_Entry_Wall', axial_plane(0)), ('Nozzle_Exit_Wall', axial_plane(nx)),
+              ('Nozzle_Inner_Wall', quads(1, 0, all_i, all_k))]
+    for s, seg in enumerate(np.array_split(all_i, n_wall_segments)):
+        groups.append((f'Nozzle_Outer_Wall_{s + 1}', quads(1, nr, seg, all_k)))
+    groups += [('Nozzle_Initial_Wall', quads(2, 0, all_i, all_j)), ('Nozzle_Revolved_Wall', quads(2, nt, all_i, all_j))]
+    for c, (k0, k1) in enumerate(channels):
+        walls = np.arange(j0, j1)
+        groups += [(f'Cooling_Channel_{c + 1}_Entry_Wall', quads(1, j0, all_i, np.arange(k0, k1))),
+                   (f'Cooling_Channel_{c + 1}_Exit_Wall', quads(1, j1, all_i, np.arange(k0, k1))),
+                   (f'Cooling_Channel_{c + 1}_Revolved_Wall', np.concatenate((quads(2, k0, all_i, walls), quads(2, k1, all_i, walls))))]
+
+    # Lattice coordinates, keeping only the nodes used by the tetrahedra
+    li, lj, lk = np.meshgrid(np.arange(nx + 1), np.arange(nr + 1), np.arange(nt + 1), indexing='ij')
+    x = length * li.ravel() / nx
+    r = inner_radius(x, length) + thickness * lj.ravel() / nr
+    theta = np.radians(sector_deg) * lk.ravel() / nt
+    used = np.zeros(len(x), dtype=bool)
+    used[tets.ravel()] = True
+    new_tag = np.cumsum(used)  # 1-based tag of every used lattice node
+    coords = np.column_stack((x, r * np.cos(theta), r * np.sin(theta)))[used]
+
+    elements, phys_sets, names = {}, {}, {}
+    tri_conn = np.concatenate([conn for _, conn in groups])
+    tri_tags = np.arange(1, len(tri_conn) + 1)
+    start = 0
+    for phys_id, (name, conn) in enumerate(groups, start=1):
+        names[phys_id] = name
+        phys_sets[phys_id] = tri_tags[start:start + len(conn)]
+        start += len(conn)
+    tet_tags = np.arange(len(tri_conn) + 1, len(tri_conn) + len(tets) + 1)
+    names[len(groups) + 1] = 'Nozzle_Volume'
+    phys_sets[len(groups) + 1] = tet_tags
+    entities = np.repeat(np.arange(1, len(groups) + 1), [len(conn) for _, conn in groups])
+    elements[2] = {'dim': 2, 'tags': tri_tags, 'conn': new_tag[tri_conn], 'entities': entities}
+    elements[4] = {'dim': 3, 'tags': tet_tags, 'conn': new_tag[tets], 'entities': np.ones(len(tets), dtype=np.int64)}
+    return {'physical_names': names, 'nodes': {'tags': np.arange(1, len(coords) + 1), 'coords': coords},
+            'elements': elements, 'phys_sets': phys_sets}
+
+def write_gmsh_v4(mesh, path):
+    """Write a mesh dict as a GMSH 4.1 ASCII file with one entity per physical group."""
+    names = mesh['physical_names']
+    volume_ids = [pid for pid, name in names.items() if name.endswith('_Volume')]
+    surface_ids = [pid for pid in names if pid not in volume_ids]
+    tags, coords = mesh['nodes']['tags'], mesh['nodes']['coords']
+    with open(path, 'wb') as f:
+        f.write(b'$MeshFormat\n4.1 0 8\n$EndMeshFormat\n')
+        f.write(f'$PhysicalNames\n{len(names)}\n'.encode())
+        for pid, name in names.items():
+            f.write(f'{3 if pid in volume_ids else 2} {pid} "{name}"\n'.encode())
+        f.write(f'$EndPhysicalNames\n$Entities\n0 0 {len(surface_ids)} {len(volume_ids)}\n'.encode())
+        for entity, pid in itertools.chain(enumerate(surface_ids, 1), enumerate(volume_ids, 1)):
+            f.write(f'{entity} 0 0 0 1 1 1 1 {pid} 0\n'.encode())
+        f.write(f'$EndEntities\n$Nodes\n1 {len(tags)} 1 {len(tags)}\n3 1 0 {len(tags)}\n'.encode())
+        for i in range(0, len(tags), gen.WRITE_CHUNK_ROWS):
+            f.write(gen._format_int_rows(tags[i:i + gen.WRITE_CHUNK_ROWS, None], sep=b' '))
+        np.savetxt(f, coords, fmt='%.12g')
+        blocks = [(2, 2, e) for e in range(1, len(surface_ids) + 1)] + [(3, 4, 1)]
+        n_elements = sum(len(b['tags']) for b in mesh['elements'].values())
+        f.write(f'$EndNodes\n$Elements\n{len(blocks)} {n_elements} 1 {n_elements}\n'.encode())
+        for dim, elem_type, entity in blocks:
+            block = mesh['elements'][elem_type]
+            mask = block['entities'] == entity
+            rows = np.column_stack((block['tags'][mask], block['conn'][mask]))
+            f.write(f'{dim} {entity} {elem_type} {len(rows)}\n'.encode())
+            for i in range(0, len(rows), gen.WRITE_CHUNK_ROWS):
+                f.write(gen._format_int_rows(rows[i:i + gen.WRITE_CHUNK_ROWS], sep=b' '))
+        f.write(b'$EndElements\n')
+
+def synthetic_mesh_path(mesh_dir, n_elements, n_channels):
+    """Synthesise (once per size) and return the path of a benchmark mesh in mesh_dir."""
+    path = Path(mesh_dir) / f'nozzle_{n_elements}_c{n_channels}.msh'
+    if not path.is_file():
+        os.makedirs(mesh_dir, exist_ok=True)
+        t = time.perf_counter()
+        tmp = path.with_suffix('.tmp')
+        write_gmsh_v4(synthesize_nozzle_mesh(n_elements, n_channels), tmp)
+        os.replace(tmp, path)
+        print(f"Synthesised {path} ({path.stat().st_size / 2**20:.1f} MB) in {time.perf_counter() - t:.1f} s")
+    return path
+
+def measure(fn, repeat, memory=True):
+    """Peak traced allocation of one run of fn (which also warms up imports and caches),
+    then the best wall time over repeat runs."""
+    result = {}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return {'seconds': min(times), 'runs': times, **result}
+
+def benchmark_size(mesh_path, work_dir, repeat, memory=True):
+    """Run every stage on one synthetic mesh inside a project skeleton in work_dir."""
+    project = Path(work_dir) / 'project'
+    shutil.rmtree(project, ignore_errors=True)
+    template_dir = REPO_DIR / 'templates'
+    shutil.copytree(template_dir, project)
+    mesh_files = {}
+    for key, dest in gen.MESH_DESTINATIONS.items():
+        gen.link_or_copy(mesh_path, project / dest)
+        mesh_files[key] = str(project / dest)
+
+    state = {}
+    def parse():
+        state['mesh'] = dict(zip(('nodes', 'elements', 'phys_sets'), gen.parse_gmsh_mesh_v4(mesh_path)),
+                             physical_names=gen.parse_physical_names(mesh_path))
+    parse()
+    mesh = state['mesh']
+    fluid = {'nodes': mesh['nodes'], 'elements': mesh['elements'], 'phys_sets': mesh['phys_sets'],
+             'physical_names': mesh['physical_names']}
+    state['polymesh'] = gen.build_polymesh(fluid)
+
+    values = gen.flatten_config(gen.load_config(REPO_DIR / 'config.yaml'))
+    values.update({name: str(mesh_path) for name in ('MESH_PATH', 'INTERIOR_MESH', 'EXTERIOR_MESH', 'COOLING_MESH', 'SOLID_MESH')})
+    # Couple the nozzle bore and the first cooling channel to the solid's own wall patches
+    values.update({'FRACTION_OF_PI': '0.1', 'simulation.cooling_solver': 'rhoCentralFoam',
+                   'INTERIOR_INTERFACE': 'Nozzle_Inner_Wall', 'SOLID_INTERFACE': 'Nozzle_Inner_Wall',
+                   'EXTERIOR_INTERFACE': 'Nozzle_Outer_Wall_1', 'COOLING_INTERFACE': 'Cooling_Channel_1_Entry_Wall'})
+    def render():
+        gen._template_manifests.clear()
+        manifest = gen.load_template_manifest(template_dir)
+        gen.render_templates(manifest, project, values, {'calculix/nozzle.inp': ['calculix/solid.inp']})
+
+    stages = {
+        'parse_physical_names': lambda: gen.parse_physical_names(mesh_path),
+        'parse_gmsh_mesh_v4': parse,
+        'write_calculix_inp': lambda: gen.write_calculix_inp(mesh['nodes'], mesh['elements'], mesh['physical_names'],
+                                                             mesh['phys_sets'], project / 'calculix/nozzle.inp'),
+        'build_polymesh': lambda: gen.build_polymesh(fluid),
+        'mesh_quality': lambda: gen.mesh_quality(fluid, gen.MESH_QUALITY_DEFAULTS, state['polymesh']),
+        'write_openfoam_polymesh': lambda: gen.write_openfoam_polymesh(state['polymesh'], project / 'openfoam/interior/constant/polyMesh', binary=True),
+        'render_templates': render,
+        'validate_generated_project': lambda: gen.validate_generated_project(project, mesh_files, {key: mesh for key in mesh_files}),
+    }
+    results = {}
+    for name in STAGES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = measure(stages[name], repeat, memory)
+    counts = {'nodes': len(mesh['nodes']['tags']),
+              'tetrahedra': sum(len(b['tags']) for t, b in mesh['elements'].items() if t in gen.GMSH_TET_TYPES),
+              'triangles': sum(len(b['tags']) for t, b in mesh['elements'].items() if t in gen.GMSH_TRI_TYPES),
+              'mesh_bytes': Path(mesh_path).stat().st_size}
+    return counts, results
+
+def environment():
+    """Commit, interpreter and machine the results were measured on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit or None, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+def format_results(runs, baseline=None):
+    """Table of stage seconds (and peak MB) per mesh size, with ratios to a baseline run."""
+    base = {(r['target_elements'], s): v['seconds'] for r in (baseline or {}).get('runs', []) for s, v in r['stages'].items()}
+    lines = [f"{'stage':<28}" + ''.join(f"{run['target_elements']:>24,}" for run in runs)]
+    for stage in STAGES:
+        cells = []
+        for run in runs:
+            v = run['stages'][stage]
+            cell = f"{v['seconds']:.3f}s"
+            if 'peak_bytes' in v:
+                cell += f" {v['peak_bytes'] / 2**20:.0f}MB"
+            if (run['target_elements'], stage) in base:
+                cell += f" x{v['seconds'] / base[run['target_elements'], stage]:.2f}"
+            cells.append(f'{cell:>24}')
+        lines.append(f'{stage:<28}' + ''.join(cells))
+    return '\n'.join(lines) + '\n'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the generator stages on synthetic GMSH 4.1 nozzle meshes.")
+    parser.add_argument('--sizes', default='10k,100k,1M', help="comma-separated element counts, e.g. 10k,100k,1M,10M (default: 10k,100k,1M)")
+    parser.add_argument('--channels', type=int, default=3, help="cooling channels in the synthetic meshes (default: 3)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, the best is reported (default: 3)")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run of every stage")
+    parser.add_argument('--mesh-dir', help="keep synthetic meshes here and reuse them across runs (default: a temporary directory)")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON results file (default: benchmark_results.json)")
+    parser.add_argument('--compare', metavar='JSON', help="earlier results file to print time ratios against")
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    work_dir = tempfile.mkdtemp(prefix='precice_nozzle_bench_')
+    mesh_dir = args.mesh_dir or os.path.join(work_dir, 'meshes')
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    results = {'environment': environment(), 'repeat': args.repeat, 'runs': []}
+    try:
+        for n in sizes:
+            mesh_path = synthetic_mesh_path(mesh_dir, n, args.channels)
+            counts, stages = benchmark_size(mesh_path, work_dir, args.repeat, not args.no_memory)
+            results['runs'].append({'target_elements': n, **counts, 'stages': stages})
+            print(f"{n:,} elements: {counts['tetrahedra']:,} tetrahedra, {counts['nodes']:,} nodes, "
+                  + ', '.join(f"{s} {v['seconds']:.3f}s" for s, v in stages.items()))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(format_results(results['runs'], baseline), end='')
+    print(f"Results written to {args.output}")
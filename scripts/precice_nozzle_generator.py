@@ -3,8 +3,23 @@ import shutil
 from pathlib import Path
 import re
 import yaml
-import glob
 import sys
+import argparse
+import itertools
+import mmap
+import struct
+import hashlib
+import json
+import tempfile
+import copy
+import time
+import contextlib
+import tracemalloc
+import cProfile
+import pstats
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 """
 precice_nozzle_generator.py
@@ -14,19 +29,204 @@ It copies and customizes template files for OpenFOAM, CalculiX, and PreCICE, and
 It also parses mesh boundaries to adapt configuration files.
 """
 
+# New files get the default permissions (0o666 less the umask), as with open()
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Stage instrumentation (--profile): None while disabled, so profile_stage and count cost
+# next to nothing in normal runs
+_profile = None
+
+def enable_profiling(cprofile_stage=None):
+    """Start recording stage timings, peak RSS, tracemalloc peaks and counters.
+    cprofile_stage: name of one stage to run under cProfile (every call of it is profiled)."""
+    global _profile
+    tracemalloc.start()
+    _profile = {'events': [], 'counters': {}, 'stack': [], 'base': [], 'start': time.perf_counter(),
+                'cprofile_stage': cprofile_stage, 'cprofile': cProfile.Profile() if cprofile_stage else None,
+                'cprofile_files': []}
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, kB elsewhere
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """Time a stage of the generation and record its memory use and counters.
+
+    Stages nest; each records wall time, the process peak RSS at its end (and how much the
+    stage raised it) and the peak tracemalloc allocation above its starting point.
+    """
+    if _profile is None:
+        yield
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    if _profile['stack']:
+        parent = _profile['stack'][-1]
+        parent['traced_peak'] = max(parent['traced_peak'], peak)
+    tracemalloc.reset_peak()
+    frame = {'name': name, 'counters': {}, 'traced_start': current, 'traced_peak': current, 'rss_start': _peak_rss_bytes()}
+    _profile['stack'].append(frame)
+    profiler = _profile['cprofile'] if name == _profile['cprofile_stage'] else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        end = time.perf_counter()
+        _profile['stack'].pop()
+        frame['traced_peak'] = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+        if _profile['stack']:
+            parent = _profile['stack'][-1]
+            parent['traced_peak'] = max(parent['traced_peak'], frame['traced_peak'])
+        rss = _peak_rss_bytes()
+        parents = _profile['base'] + [f['name'] for f in _profile['stack']]
+        _profile['events'].append({
+            'name': name, 'pid': os.getpid(), 'depth': len(parents), 'parents': parents,
+            'start': start - _profile['start'], 'seconds': end - start,
+            'traced_peak_bytes': frame['traced_peak'] - frame['traced_start'],
+            'peak_rss_bytes': rss, 'rss_growth_bytes': rss - frame['rss_start'] if rss is not None else None,
+            'counters': frame['counters'],
+        })
+
+def count(name, amount=1):
+    """Add amount to a profiling counter (nodes parsed, bytes written, files rendered...),
+    attributed to the innermost running stage and to the run total."""
+    if _profile is None:
+        return
+    _profile['counters'][name] = _profile['counters'].get(name, 0) + amount
+    if _profile['stack']:
+        counters = _profile['stack'][-1]['counters']
+        counters[name] = counters.get(name, 0) + amount
+
+def count_bytes_written(*paths):
+    """Count the size of written files (directories are walked) as bytes_written."""
+    if _profile is None:
+        return
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+        elif os.path.isfile(path):
+            total += os.path.getsize(path)
+    count('bytes_written', total)
+
+def _profiled_call(settings, fn, *args):
+    """Worker entry point: run fn, recording a fresh profile when the parent profiles
+    (settings is its (time origin, cProfile stage, running stages), or None), and return
+    (result, profile data) for merge_profile."""
+    global _profile
+    if settings is None:
+        _profile = None  # a forked worker may have inherited the parent's profile
+        return fn(*args), None
+    origin, cprofile_stage, parents = settings
+    enable_profiling(cprofile_stage)
+    _profile['start'] = origin  # perf_counter is system-wide, so worker stages share the parent's timeline
+    _profile['base'] = parents  # worker stages nest under the stage that submitted them
+    result = fn(*args)
+    data = {'events': _profile['events'], 'counters': _profile['counters'], 'cprofile_files': _profile['cprofile_files']}
+    if _profile['cprofile'] is not None and _profile['cprofile'].getstats():
+        fd, path = tempfile.mkstemp(suffix='.prof')
+        os.close(fd)
+        _profile['cprofile'].dump_stats(path)
+        data['cprofile_files'].append(path)
+    return result, data
+
+def merge_profile(data):
+    """Merge the profile data returned by a _profiled_call worker."""
+    if _profile is None or data is None:
+        return
+    _profile['events'].extend(data['events'])
+    for name, amount in data['counters'].items():
+        _profile['counters'][name] = _profile['counters'].get(name, 0) + amount
+    _profile['cprofile_files'].extend(data['cprofile_files'])
+
+def _submit(pool, fn, *args):
+    """pool.submit through _profiled_call; pair with _result."""
+    settings = None
+    if _profile is not None:
+        settings = (_profile['start'], _profile['cprofile_stage'], _profile['base'] + [f['name'] for f in _profile['stack']])
+    return pool.submit(_profiled_call, settings, fn, *args)
+
+def _result(future):
+    result, data = future.result()
+    merge_profile(data)
+    return result
+
+def format_profile_summary():
+    """Table of the recorded stages aggregated by their position in the stage tree (worker
+    processes included), with calls, wall time, peak RSS, traced allocation peak and
+    counters, then run totals."""
+    rows = {}
+    for event in sorted(_profile['events'], key=lambda e: e['start']):
+        path = tuple(event['parents']) + (event['name'],)
+        row = rows.setdefault(path, {'depth': event['depth'], 'first': event['start'], 'calls': 0, 'seconds': 0.0, 'traced': 0, 'rss': 0, 'counters': {}})
+        row['calls'] += 1
+        row['seconds'] += event['seconds']
+        row['traced'] = max(row['traced'], event['traced_peak_bytes'])
+        row['rss'] = max(row['rss'], event['peak_rss_bytes'] or 0)
+        for name, amount in event['counters'].items():
+            row['counters'][name] = row['counters'].get(name, 0) + amount
+    mb = lambda b: f"{b / 2**20:.1f}"
+    lines = [f"{'stage':<40}{'calls':>6}{'seconds':>10}{'peak RSS MB':>13}{'traced MB':>11}  counters"]
+    # Depth-first: each stage follows its parent, siblings in order of first start
+    tree_order = lambda path: [rows[path[:i]]['first'] if path[:i] in rows else rows[path]['first'] for i in range(1, len(path) + 1)]
+    for path in sorted(rows, key=tree_order):
+        row = rows[path]
+        counters = ', '.join(f"{k}={v:,}" for k, v in row['counters'].items())
+        lines.append(f"{'  ' * row['depth'] + path[-1]:<40}{row['calls']:>6}{row['seconds']:>10.3f}{mb(row['rss']):>13}{mb(row['traced']):>11}  {counters}")
+    lines.append(f"total {time.perf_counter() - _profile['start']:.3f} s; " + ', '.join(f"{k}={v:,}" for k, v in _profile['counters'].items()))
+    return '\n'.join(lines) + '\n'
+
+def write_profile(path):
+    """Write the recorded stages as JSON that is also a Chrome trace (chrome://tracing,
+    Perfetto): complete events per stage plus the raw stage records and counters. With
+    a cProfile stage, its statistics go to <path stem>.<stage>.prof and the top entries
+    are printed."""
+    events = [{'name': e['name'], 'cat': 'stage', 'ph': 'X', 'pid': e['pid'], 'tid': e['pid'],
+               'ts': round(e['start'] * 1e6), 'dur': round(e['seconds'] * 1e6),
+               'args': {k: v for k, v in e.items() if k not in ('name', 'pid', 'start', 'seconds')}}
+              for e in _profile['events']]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'stages': _profile['events'], 'counters': _profile['counters']}, f, indent=1)
+    stage = _profile['cprofile_stage']
+    if stage:
+        sources = _profile['cprofile_files'] + ([_profile['cprofile']] if _profile['cprofile'].getstats() else [])
+        if not sources:
+            print(f"cProfile: stage {stage} did not run")
+            return
+        stats = pstats.Stats(*sources)
+        for worker_file in _profile['cprofile_files']:
+            os.unlink(worker_file)
+        prof_path = os.path.splitext(path)[0] + '.' + re.sub(r'[^\w.-]+', '_', stage) + '.prof'
+        stats.dump_stats(prof_path)
+        print(f"cProfile of stage {stage} written to {prof_path}")
+        stats.sort_stats('cumulative').print_stats(20)
+
 def parse_physical_names(mesh_path):
     """Parse the $PhysicalNames section of a GMSH .msh file and return a dict of {id: name}."""
     names = {}
-    with open(mesh_path, 'r', encoding='utf-8', errors='ignore') as f:
-        lines = f.readlines()
     try:
-        start = lines.index('$PhysicalNames\n')
-        count = int(lines[start+1])
-        for i in range(count):
-            parts = lines[start+2+i].strip().split(' ', 2)
-            if len(parts) == 3:
-                _, phys_id, name = parts
-                names[int(phys_id)] = name.strip('"')
+        with open(mesh_path, 'r', encoding='utf-8', errors='ignore') as f:
+            # $PhysicalNames precedes the bulk $Nodes/$Elements data, so stop reading once it is done
+            for line in f:
+                if line.strip() == '$PhysicalNames':
+                    break
+            else:
+                raise ValueError("no $PhysicalNames section")
+            count = int(f.readline())
+            for _ in range(count):
+                parts = f.readline().strip().split(' ', 2)
+                if len(parts) == 3:
+                    _, phys_id, name = parts
+                    names[int(phys_id)] = name.strip('"')
     except Exception as e:
         print(f"Could not parse $PhysicalNames in {mesh_path}: {e}")
     return names
@@ -35,19 +235,150 @@ def find_interfaces(physical_names, pattern):
     """Return a list of physical names matching a regex pattern."""
     return [name for name in physical_names.values() if re.search(pattern, name)]
 
-def replace_in_file(filepath, replacements):
-    """Replace placeholders in a file with values from the replacements dict."""
-    with open(filepath, 'r') as f:
-        content = f.read()
-    for key, value in replacements.items():
-        content = content.replace(key, value)
-    with open(filepath, 'w') as f:
-        f.write(content)
+# {{name}} placeholder of the project templates
+TEMPLATE_TOKEN = re.compile(r'\{\{(.*?)\}\}')
 
-def replace_in_dir(directory, replacements):
-    for filepath in glob.glob(f"{directory}/**", recursive=True):
-        if os.path.isfile(filepath):
-            replace_in_file(filepath, replacements)
+def compile_template(text):
+    """Split template text into segments: literals at even indices, token names at odd ones."""
+    return TEMPLATE_TOKEN.split(text)
+
+def render_template(segments, values, unresolved):
+    """Fill compiled segments in a single pass. Tokens missing from values are kept
+    as-is and added to the unresolved set."""
+    parts = list(segments)
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        if name in values:
+            parts[i] = values[name]
+        else:
+            unresolved.add(name)
+            parts[i] = f'{{{{{name}}}}}'
+    return ''.join(parts)
+
+_template_manifests = {}
+
+def load_template_manifest(template_dir):
+    """Compile every text file under template_dir holding {{...}} tokens, once per process.
+
+    Returns {relative posix path: segments}. Files outside the manifest (meshes, binaries,
+    files without tokens) are copied verbatim and never rendered.
+    """
+    key = str(Path(template_dir).resolve())
+    if key not in _template_manifests:
+        manifest = {}
+        for path in sorted(Path(template_dir).rglob('*')):
+            if not path.is_file() or path.suffix == '.msh':
+                continue
+            try:
+                text = path.read_text()
+            except UnicodeDecodeError:
+                continue
+            if '{{' in text:
+                manifest[path.relative_to(template_dir).as_posix()] = compile_template(text)
+        _template_manifests[key] = manifest
+    return _template_manifests[key]
+
+def render_templates(manifest, output_dir, values, targets=None, deps=None):
+    """Render the manifest templates into output_dir.
+
+    targets: optional {template path: [output paths]} for templates written elsewhere than
+    their own path (an empty list skips the template).
+    deps: optional dependency tracking from load_dependency_manifest; outputs whose template
+    and referenced values are unchanged since the last run are not rewritten.
+    Returns {output path: sorted unresolved token names} for files left with tokens.
+    """
+    targets = targets or {}
+    unresolved = {}
+    for rel, segments in manifest.items():
+        tokens = sorted(set(segments[1::2]))
+        missing = [name for name in tokens if name not in values]
+        inputs = fingerprint(segments, {name: values.get(name) for name in tokens})
+        for out_rel in targets.get(rel, [rel]):
+            if deps is None or not up_to_date(deps, out_rel, inputs, output_dir):
+                text = render_template(segments, values, set())
+                with open_output(Path(output_dir) / out_rel, 'w') as f:
+                    f.write(text)
+                count('files_rendered')
+                count('bytes_written', len(text.encode()))
+            else:
+                count('files_unchanged')
+            if missing:
+                unresolved[out_rel] = missing
+    return unresolved
+
+# State of a generated project: dependency manifest and local artefact store
+GENERATOR_STATE_DIR = '.generator'
+
+def load_dependency_manifest(output_dir, force=False):
+    """Start dependency tracking for a project, seeded with the {output: input fingerprint}
+    manifest of its previous generation. The fingerprints are ignored when force is set, or
+    when the manifest was written by another generator version; its list of outputs is
+    always kept, so remove_stale_outputs can delete those this generation no longer writes."""
+    previous, produced = {}, []
+    path = Path(output_dir) / GENERATOR_STATE_DIR / 'manifest.json'
+    if path.is_file():
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            produced = list(data['outputs'])
+            if not force and data.get('generator') == generator_version():
+                previous = data['outputs']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable dependency manifest {path}: {e}")
+    return {'previous': previous, 'produced': produced, 'outputs': {}, 'skipped': [], 'rebuilt': [], 'removed': []}
+
+def up_to_date(deps, outputs, inputs, output_dir):
+    """Record the input fingerprint of a group of outputs (paths relative to output_dir).
+
+    Returns True when the previous generation built every output of the group from the same
+    inputs and they all still exist, so the group can be skipped.
+    """
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+    fresh = all(deps['previous'].get(rel) == inputs and os.path.lexists(os.path.join(output_dir, rel)) for rel in outputs)
+    for rel in outputs:
+        deps['outputs'][rel] = inputs
+    deps['skipped' if fresh else 'rebuilt'].extend(outputs)
+    return fresh
+
+def remove_stale_outputs(output_dir, deps):
+    """Delete the outputs of the previous generation that this one did not record, and the
+    directories they leave empty."""
+    output_dir = Path(output_dir)
+    for rel in sorted(set(deps['produced']) - set(deps['outputs'])):
+        path = output_dir / rel
+        if os.path.lexists(path):
+            os.unlink(path)
+            deps['removed'].append(rel)
+        for parent in path.parents:
+            if parent == output_dir or not parent.is_dir() or any(parent.iterdir()):
+                break
+            parent.rmdir()
+
+def save_dependency_manifest(output_dir, deps):
+    path = Path(output_dir) / GENERATOR_STATE_DIR / 'manifest.json'
+    os.makedirs(path.parent, exist_ok=True)
+    with open_output(path, 'w') as f:
+        json.dump({'generator': generator_version(), 'outputs': deps['outputs']}, f, indent=1, sort_keys=True)
+
+def format_skip_report(deps):
+    """Summarise an incremental generation: rebuilt and removed outputs by name (or by
+    directory when there are many), skipped ones counted by directory."""
+    def by_directory(paths):
+        counts = OrderedDict()
+        for rel in sorted(paths):
+            parts = rel.split('/')
+            directory = '/'.join(parts[:2 if parts[0] == 'openfoam' else 1]) if len(parts) > 1 else '.'
+            counts[directory] = counts.get(directory, 0) + 1
+        return ', '.join(f"{d} ({n})" for d, n in counts.items())
+    skipped, rebuilt, removed = deps['skipped'], deps['rebuilt'], deps['removed']
+    lines = [f"Incremental generation: {len(rebuilt)} outputs rebuilt, {len(skipped)} skipped (inputs unchanged), {len(removed)} stale removed"]
+    if rebuilt:
+        lines.append("  rebuilt: " + (', '.join(sorted(rebuilt)) if len(rebuilt) <= 10 else by_directory(rebuilt)))
+    if removed:
+        lines.append("  removed: " + (', '.join(sorted(removed)) if len(removed) <= 10 else by_directory(removed)))
+    if skipped:
+        lines.append("  skipped: " + by_directory(skipped))
+    return '\n'.join(lines) + '\n'
 
 def parse_gmsh_mesh(mesh_path):
     """Parse a GMSH .msh file and return nodes, elements, and physical sets."""
@@ -85,71 +416,470 @@ def parse_gmsh_mesh(mesh_path):
         print(f"Error parsing mesh: {e}")
     return nodes, elements, phys_sets
 
+# Number of nodes per GMSH element type (see the GMSH reference manual, "MSH file format")
+GMSH_NODES_PER_ELEMENT = {
+    1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 10: 9,
+    11: 10, 12: 27, 13: 18, 14: 14, 15: 1, 16: 8, 17: 20, 18: 15, 19: 13,
+}
+# Number of text lines parsed per NumPy call when streaming ASCII blocks
+ASCII_CHUNK_LINES = 65536
+
+def _index_dtype(max_tag):
+    """Smallest signed integer dtype able to hold tags up to max_tag."""
+    return np.int32 if max_tag < np.iinfo(np.int32).max else np.int64
+
+def _read_ascii_rows(f, out):
+    """Fill the 2D array out with out.shape[0] whitespace-separated text lines read from f.
+
+    Lines are parsed in chunks of ASCII_CHUNK_LINES straight into the array, so no
+    per-value Python objects are created.
+    """
+    flat = out.reshape(-1)
+    pos = 0
+    remaining = out.shape[0]
+    while remaining:
+        n = min(remaining, ASCII_CHUNK_LINES)
+        values = np.fromstring(b''.join(itertools.islice(f, n)), dtype=out.dtype, sep=' ')
+        if pos + values.size > flat.size:
+            raise ValueError(f"unexpected number of values in block ({pos + values.size} > {flat.size})")
+        flat[pos:pos + values.size] = values
+        pos += values.size
+        remaining -= n
+    if pos != flat.size:
+        raise ValueError(f"truncated block ({pos} of {flat.size} values)")
+    return out
+
+def _skip_section(f, name):
+    end = b'$End' + name
+    for line in f:
+        if line.strip() == end:
+            return
+    raise ValueError(f"missing $End{name.decode()}")
+
+def _parse_entities_v4(f):
+    """Parse $Entities and return {(dim, entity_tag): [physical tags]}."""
+    counts = list(map(int, f.readline().split()))
+    entity_phys = {}
+    for dim, count in enumerate(counts[:4]):
+        for _ in range(count):
+            parts = f.readline().split()
+            tag = int(parts[0])
+            # points: tag x y z nPhys ...; curves/surfaces/volumes: tag minXYZ maxXYZ nPhys ...
+            n_idx = 4 if dim == 0 else 7
+            num_phys = int(parts[n_idx])
+            entity_phys[(dim, tag)] = [abs(int(p)) for p in parts[n_idx + 1:n_idx + 1 + num_phys]]
+    _skip_section(f, b'Entities')
+    return entity_phys
+
+def _parse_nodes_v4(f):
+    num_blocks, num_nodes, _, max_tag = map(int, f.readline().split())
+    tags = np.empty(num_nodes, dtype=_index_dtype(max_tag))
+    coords = np.empty((num_nodes, 3), dtype=np.float64)
+    pos = 0
+    for _ in range(num_blocks):
+        entity_dim, _, parametric, n = map(int, f.readline().split())
+        if n == 0:
+            continue
+        _read_ascii_rows(f, tags[pos:pos + n].reshape(n, 1))
+        ncols = 3 + (entity_dim if parametric else 0)
+        if ncols == 3:
+            _read_ascii_rows(f, coords[pos:pos + n])
+        else:
+            coords[pos:pos + n] = _read_ascii_rows(f, np.empty((n, ncols)))[:, :3]
+        pos += n
+    _skip_section(f, b'Nodes')
+    return {'tags': tags, 'coords': coords}
+
+def _parse_elements_v4(f, entity_phys, node_dtype):
+    num_blocks, _, _, max_tag = map(int, f.readline().split())
+    tag_dtype = _index_dtype(max_tag)
+    row_dtype = np.promote_types(tag_dtype, node_dtype)
+    blocks = {}
+    phys_blocks = {}
+    for _ in range(num_blocks):
+        entity_dim, entity_tag, elem_type, n = map(int, f.readline().split())
+        if n == 0:
+            continue
+        nodes_per_elem = GMSH_NODES_PER_ELEMENT.get(elem_type)
+        if nodes_per_elem is None:
+            raise ValueError(f"unsupported GMSH element type {elem_type}")
+        rows = _read_ascii_rows(f, np.empty((n, nodes_per_elem + 1), dtype=row_dtype))
+        elem_tags = rows[:, 0].astype(tag_dtype)
+        conn = rows[:, 1:].astype(node_dtype)
+        del rows
+        blocks.setdefault(elem_type, []).append((entity_dim, entity_tag, elem_tags, conn))
+        for phys_id in entity_phys.get((entity_dim, entity_tag), ()):
+            phys_blocks.setdefault(phys_id, []).append(elem_tags)
+    _skip_section(f, b'Elements')
+    return _assemble_elements(blocks, phys_blocks)
+
+def _join(arrays):
+    """Concatenate block arrays, returning the block itself (no copy) when there is only one."""
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+def _assemble_elements(blocks, phys_blocks):
+    """Merge per-entity element blocks into the per-type arrays returned by parse_gmsh_mesh_v4."""
+    elements = {}
+    for elem_type, parts in blocks.items():
+        elements[elem_type] = {
+            'dim': parts[0][0],
+            'tags': _join([p[2] for p in parts]),
+            'conn': _join([p[3] for p in parts]),
+            'entities': _join([np.full(len(p[2]), p[1], dtype=np.int32) for p in parts]),
+        }
+        parts.clear()
+    phys_sets = {phys_id: _join(arrs) for phys_id, arrs in phys_blocks.items()}
+    return elements, phys_sets
+
+def _mm_index(mm, sub, start=0):
+    """mmap.find that raises like bytes.index when sub is missing."""
+    pos = mm.find(sub, start)
+    if pos < 0:
+        raise ValueError(f"{sub!r} not found in mesh file")
+    return pos
+
+def _parse_gmsh_mesh_v4_binary(mesh_path, data_size):
+    """Parse a binary GMSH 4.1 .msh file through a read-only memory map.
+
+    Node tags, coordinates, element tags and connectivity are returned as zero-copy
+    NumPy views into the map whenever they come from a single entity block (arrays
+    spread over several blocks are concatenated once). Byte order is taken from the
+    integer written after the $MeshFormat line and size_t width from its data-size field.
+    """
+    with open(mesh_path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    pos = _mm_index(mm, b'\n', _mm_index(mm, b'$MeshFormat')) + 1
+    pos = _mm_index(mm, b'\n', pos) + 1
+    endian = '<' if struct.unpack_from('<i', mm, pos)[0] == 1 else '>'
+    pos = _mm_index(mm, b'$EndMeshFormat', pos)
+    tag_t = np.dtype(f'{endian}i{data_size}')
+    size_fmt = {4: 'I', 8: 'Q'}[data_size]
+    block_header = struct.Struct(f'{endian}iii{size_fmt}')
+
+    def read(fmt, offset):
+        values = struct.unpack_from(endian + fmt, mm, offset)
+        return values, offset + struct.calcsize(endian + fmt)
+
+    nodes = {'tags': np.empty(0, dtype=tag_t), 'coords': np.empty((0, 3))}
+    elements, phys_sets, entity_phys = {}, {}, {}
+    while True:
+        pos = mm.find(b'$', pos)
+        if pos < 0:
+            break
+        eol = _mm_index(mm, b'\n', pos)
+        name = mm[pos + 1:eol].strip()
+        pos = eol + 1
+        if name.startswith(b'End'):
+            continue
+        if name == b'Entities':
+            counts, pos = read(4 * size_fmt, pos)
+            for dim, count in enumerate(counts):
+                for _ in range(count):
+                    (tag,), pos = read('i', pos)
+                    pos += 8 * (3 if dim == 0 else 6)
+                    (num_phys,), pos = read(size_fmt, pos)
+                    phys, pos = read(f'{num_phys}i', pos)
+                    entity_phys[(dim, tag)] = [abs(p) for p in phys]
+                    if dim > 0:
+                        (num_bnd,), pos = read(size_fmt, pos)
+                        pos += 4 * num_bnd
+        elif name == b'Nodes':
+            (num_blocks, _, _, _), pos = read(4 * size_fmt, pos)
+            tag_blocks, coord_blocks = [], []
+            for _ in range(num_blocks):
+                entity_dim, _, parametric, n = block_header.unpack_from(mm, pos)
+                pos += block_header.size
+                tag_blocks.append(np.frombuffer(mm, dtype=tag_t, count=n, offset=pos))
+                pos += n * data_size
+                ncols = 3 + (entity_dim if parametric else 0)
+                coord_blocks.append(np.frombuffer(mm, dtype=f'{endian}f8', count=n * ncols, offset=pos).reshape(n, ncols)[:, :3])
+                pos += 8 * n * ncols
+            if tag_blocks:
+                nodes = {'tags': _join(tag_blocks), 'coords': _join(coord_blocks)}
+        elif name == b'Elements':
+            (num_blocks, _, _, _), pos = read(4 * size_fmt, pos)
+            blocks, phys_blocks = {}, {}
+            for _ in range(num_blocks):
+                entity_dim, entity_tag, elem_type, n = block_header.unpack_from(mm, pos)
+                pos += block_header.size
+                nodes_per_elem = GMSH_NODES_PER_ELEMENT.get(elem_type)
+                if nodes_per_elem is None:
+                    raise ValueError(f"unsupported GMSH element type {elem_type}")
+                rows = np.frombuffer(mm, dtype=tag_t, count=n * (nodes_per_elem + 1), offset=pos).reshape(n, nodes_per_elem + 1)
+                pos += rows.nbytes
+                blocks.setdefault(elem_type, []).append((entity_dim, entity_tag, rows[:, 0], rows[:, 1:]))
+                for phys_id in entity_phys.get((entity_dim, entity_tag), ()):
+                    phys_blocks.setdefault(phys_id, []).append(rows[:, 0])
+            elements, phys_sets = _assemble_elements(blocks, phys_blocks)
+        # Jump past the section body (binary sections are positioned just before their end marker)
+        pos = _mm_index(mm, b'$End' + name, pos)
+    return nodes, elements, phys_sets
+
 def parse_gmsh_mesh_v4(mesh_path):
-    """Parse a GMSH 4.x .msh file and return nodes, elements, and physical sets."""
-    nodes = {}
-    elements = []
+    """Parse a GMSH 4.1 .msh file in a single streaming pass.
+
+    ASCII files are parsed block by block into preallocated arrays; binary files are
+    memory-mapped (see _parse_gmsh_mesh_v4_binary).
+
+    Returns (nodes, elements, phys_sets):
+      nodes: {'tags': (N,) int array, 'coords': (N, 3) float64 array}
+      elements: {gmsh_elem_type: {'dim', 'tags': (M,), 'conn': (M, k) node tags, 'entities': (M,) entity tags}}
+      phys_sets: {physical_id: array of element tags}, resolved through $Entities
+    """
+    nodes = {'tags': np.empty(0, dtype=np.int32), 'coords': np.empty((0, 3))}
+    elements = {}
     phys_sets = {}
-    with open(mesh_path, 'r', encoding='utf-8', errors='ignore') as f:
-        lines = f.readlines()
-    # Parse $Nodes
+    entity_phys = {}
     try:
-        node_start = lines.index('$Nodes\n') + 1
-        header = list(map(int, lines[node_start].split()))
-        num_entity_blocks = header[0]
-        node_lines = []
-        idx = node_start + 1
-        for _ in range(num_entity_blocks):
-            ent_hdr = list(map(int, lines[idx].split()))
-            num_nodes_in_block = ent_hdr[3]
-            idx += 1  # skip header
-            idx += 1  # skip parametric flag line
-            for _ in range(num_nodes_in_block):
-                node_id = int(lines[idx].strip())
-                idx += 1
-                coords = tuple(map(float, lines[idx].strip().split()))
-                nodes[node_id] = coords
-                idx += 1
-        # Parse $Elements
-        elem_start = lines.index('$Elements\n') + 1
-        elem_header = list(map(int, lines[elem_start].split()))
-        num_elem_blocks = elem_header[0]
-        idx = elem_start + 1
-        for _ in range(num_elem_blocks):
-            ent_hdr = list(map(int, lines[idx].split()))
-            entity_dim, entity_tag, elem_type, num_elems_in_block = ent_hdr
-            idx += 1
-            for _ in range(num_elems_in_block):
-                parts = lines[idx].strip().split()
-                elem_id = int(parts[0])
-                conn = list(map(int, parts[1:]))
-                elements.append((elem_id, elem_type, entity_tag, conn))
-                if entity_tag not in phys_sets:
-                    phys_sets[entity_tag] = []
-                phys_sets[entity_tag].append(elem_id)
-                idx += 1
+        with open(mesh_path, 'rb') as f:
+            for line in f:
+                section = line.strip()
+                if not section.startswith(b'$') or section.startswith(b'$End'):
+                    continue
+                name = section[1:]
+                if name == b'MeshFormat':
+                    _, file_type, data_size = f.readline().split()
+                    if int(file_type) == 1:
+                        break
+                    _skip_section(f, name)
+                elif name == b'Entities':
+                    entity_phys = _parse_entities_v4(f)
+                elif name == b'Nodes':
+                    nodes = _parse_nodes_v4(f)
+                elif name == b'Elements':
+                    elements, phys_sets = _parse_elements_v4(f, entity_phys, nodes['tags'].dtype)
+                else:
+                    _skip_section(f, name)
+            else:
+                return nodes, elements, phys_sets
+        return _parse_gmsh_mesh_v4_binary(mesh_path, int(data_size))
     except Exception as e:
         print(f"Error parsing mesh: {e}")
     return nodes, elements, phys_sets
 
+# Bump whenever the parsed mesh layout changes so stale cache entries are ignored
+MESH_PARSER_VERSION = 1
+MESH_CACHE_DIR = os.environ.get('PRECICE_NOZZLE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'precice_nozzle_generator'))
+MESH_CACHE_MAX_BYTES = int(os.environ.get('PRECICE_NOZZLE_CACHE_MAX_MB', 4096)) * 2**20
+MESH_MEMO_SIZE = 8
+
+_mesh_memo = OrderedDict()  # content key -> parsed mesh, most recently used last
+_hash_memo = {}  # (realpath, size, mtime_ns) -> content hash
+
+def file_hash(path):
+    """Content hash of a file, memoised on (path, size, mtime) for the lifetime of the process."""
+    st = os.stat(path)
+    stat_key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    if stat_key not in _hash_memo:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        _hash_memo[stat_key] = h.hexdigest()
+    return _hash_memo[stat_key]
+
+def fingerprint(*parts):
+    """Hash of JSON-serialisable inputs, for store keys and the dependency manifest."""
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=20).hexdigest()
+
+def generator_version():
+    """Content hash of this script: outputs of another generator version are never reused."""
+    return file_hash(__file__)
+
+def _mesh_to_arrays(mesh):
+    arrays = {
+        'physical_names': np.array(json.dumps(mesh['physical_names'])),
+        'node_tags': mesh['nodes']['tags'],
+        'node_coords': mesh['nodes']['coords'],
+    }
+    for elem_type, block in mesh['elements'].items():
+        arrays[f'elem_{elem_type}_dim'] = np.array(block['dim'])
+        for field in ('tags', 'conn', 'entities'):
+            arrays[f'elem_{elem_type}_{field}'] = block[field]
+    for phys_id, tags in mesh['phys_sets'].items():
+        arrays[f'phys_{phys_id}'] = tags
+    return arrays
+
+def _mesh_from_arrays(arrays):
+    mesh = {
+        'physical_names': {int(k): v for k, v in json.loads(str(arrays['physical_names'])).items()},
+        'nodes': {'tags': arrays['node_tags'], 'coords': arrays['node_coords']},
+        'elements': {},
+        'phys_sets': {},
+    }
+    for key in arrays:
+        parts = key.split('_')
+        if parts[0] == 'elem' and parts[2] == 'dim':
+            elem_type = int(parts[1])
+            mesh['elements'][elem_type] = {
+                'dim': int(arrays[key]),
+                **{field: arrays[f'elem_{elem_type}_{field}'] for field in ('tags', 'conn', 'entities')},
+            }
+        elif parts[0] == 'phys':
+            mesh['phys_sets'][int(parts[1])] = arrays[key]
+    return mesh
+
+def _evict_mesh_cache(cache_dir, max_bytes):
+    """Delete least recently used cache entries until the cache fits in max_bytes."""
+    entries = []
+    for path in Path(cache_dir).glob('*.npz'):
+        st = path.stat()
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+def load_mesh(mesh_path, cache_dir=MESH_CACHE_DIR, max_cache_bytes=MESH_CACHE_MAX_BYTES):
+    """Parse a GMSH mesh once and return {'physical_names', 'nodes', 'elements', 'phys_sets'}.
+
+    Results are memoised in-process and stored on disk as .npz under cache_dir, keyed by
+    the file content hash and MESH_PARSER_VERSION, so regenerating a project from the same
+    meshes skips parsing entirely. The disk cache is capped at max_cache_bytes with LRU
+    eviction; pass cache_dir=None to disable it.
+    """
+    with profile_stage('load_mesh'):
+        return _load_mesh(mesh_path, cache_dir, max_cache_bytes)
+
+def _load_mesh(mesh_path, cache_dir, max_cache_bytes):
+    key = f"{file_hash(mesh_path)}-v{MESH_PARSER_VERSION}"
+    if key in _mesh_memo:
+        _mesh_memo.move_to_end(key)
+        count('mesh_memo_hits')
+        return _mesh_memo[key]
+    mesh = None
+    cache_path = Path(cache_dir) / f"{key}.npz" if cache_dir else None
+    if cache_path is not None and cache_path.is_file():
+        try:
+            with np.load(cache_path) as arrays:
+                mesh = _mesh_from_arrays(arrays)
+            os.utime(cache_path)  # mark as recently used
+            count('mesh_cache_hits')
+        except Exception as e:
+            print(f"Ignoring unreadable mesh cache entry {cache_path}: {e}")
+    if mesh is None:
+        with profile_stage('parse_gmsh_mesh_v4'):
+            nodes, elements, phys_sets = parse_gmsh_mesh_v4(mesh_path)
+            count('nodes_parsed', len(nodes['tags']))
+            count('elements_parsed', sum(len(block['tags']) for block in elements.values()))
+            count('bytes_parsed', os.path.getsize(mesh_path))
+        mesh = {
+            'physical_names': parse_physical_names(mesh_path),
+            'nodes': nodes,
+            'elements': elements,
+            'phys_sets': phys_sets,
+        }
+        if cache_path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **_mesh_to_arrays(mesh))
+                os.replace(tmp, cache_path)
+                _evict_mesh_cache(cache_dir, max_cache_bytes)
+            except OSError as e:
+                print(f"Could not write mesh cache entry {cache_path}: {e}")
+    _mesh_memo[key] = mesh
+    while len(_mesh_memo) > MESH_MEMO_SIZE:
+        _mesh_memo.popitem(last=False)
+    return mesh
+
+# GMSH element type -> (CalculiX element type, node permutation from GMSH to CalculiX order)
+CALCULIX_ELEMENT_TYPES = {
+    4: ('C3D4', None),
+    11: ('C3D10', [0, 1, 2, 3, 4, 5, 6, 7, 9, 8]),  # GMSH and CalculiX swap the last two mid-edge nodes
+}
+# CalculiX reads at most 16 entries per data line
+CALCULIX_IDS_PER_LINE = 16
+WRITE_CHUNK_ROWS = 65536
+
+def _format_int_rows(table, sep=b', ', prefix=b'', suffix=b'\n'):
+    """Format a 2D table of non-negative integers as ASCII rows using NumPy digit arithmetic.
+
+    Every value gets a fixed-width slot of digits plus separator between prefix and suffix;
+    leading zeros and the separator after the last column are then dropped with one
+    boolean mask.
+    """
+    n, m = table.shape
+    if table.size == 0:
+        return b''
+    width = len(str(int(table.max())))
+    slot = width + len(sep)
+    start, stop = len(prefix), len(prefix) + m * slot
+    buf = np.empty((n, stop + len(suffix)), dtype=np.uint8)
+    keep = np.ones(buf.shape, dtype=bool)
+    body = buf[:, start:stop].reshape(n, m, slot)
+    body_keep = keep[:, start:stop].reshape(n, m, slot)
+    v = table.astype(np.int64)
+    for k in range(width - 1, -1, -1):
+        if k < width - 1:
+            body_keep[:, :, k] = v > 0
+        v, digit = np.divmod(v, 10)
+        body[:, :, k] = digit
+    body[:, :, :width] += ord('0')
+    body[:, :, width:] = np.frombuffer(sep, dtype=np.uint8)
+    body_keep[:, -1, width:] = False
+    buf[:, :start] = np.frombuffer(prefix, dtype=np.uint8)
+    buf[:, stop:] = np.frombuffer(suffix, dtype=np.uint8)
+    return buf[keep].tobytes()
+
+def _write_int_rows(f, *columns):
+    """Write integer column arrays as comma-separated rows, WRITE_CHUNK_ROWS rows at a time."""
+    for i in range(0, len(columns[0]), WRITE_CHUNK_ROWS):
+        f.write(_format_int_rows(np.column_stack([c[i:i + WRITE_CHUNK_ROWS] for c in columns])))
+
+def _write_chunked(f, row_fmt, *columns):
+    """Write rows built from column arrays using one %-format call per WRITE_CHUNK_ROWS rows.
+
+    Integer columns mixed with float columns are promoted to float; row_fmt uses %d for
+    those, which formats them back as integers.
+    """
+    for i in range(0, len(columns[0]), WRITE_CHUNK_ROWS):
+        chunk = np.column_stack([c[i:i + WRITE_CHUNK_ROWS] for c in columns])
+        f.write(((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist())).encode())
+
+def _write_id_list(f, ids, per_line=CALCULIX_IDS_PER_LINE):
+    """Write a *Nset/*Elset style id list wrapped at per_line entries."""
+    ids = np.asarray(ids)
+    full = len(ids) - len(ids) % per_line
+    if full:
+        _write_int_rows(f, ids[:full].reshape(-1, per_line))
+    if full < len(ids):
+        f.write(_format_int_rows(ids[full:].reshape(1, -1)))
+
 def write_calculix_inp(nodes, elements, phys_names, phys_sets, out_path):
-    with open(out_path, 'w') as f:
-        f.write('*Heading\n** Auto-generated CalculiX input\n')
-        f.write('*Node\n')
-        for node_id, coords in nodes.items():
-            f.write(f"{node_id}, {coords[0]}, {coords[1]}, {coords[2]}\n")
-        f.write('*Element, type=C3D4\n')
-        for elem_id, elem_type, phys_grp, conn in elements:
-            if elem_type == 4:  # Tetrahedral
-                f.write(f"{elem_id}, {', '.join(map(str, conn))}\n")
+    """Write nodes, volume elements and physical-group element sets as a CalculiX mesh deck,
+    included by solid.inp, which holds the material and step.
+
+    Arrays are formatted in chunks rather than per node/element, and element sets only
+    list elements that were written (C3D4/C3D10); surface groups are handled by
+    write_calculix_surfaces.
+    """
+    with open_output(out_path, 'wb', buffering=1 << 20) as f:
+        f.write(b'** Auto-generated CalculiX mesh deck, included by solid.inp\n')
+        f.write(b'*Node\n')
+        # %.17g round-trips float64 exactly and formats faster than repr()
+        _write_chunked(f, '%d, %.17g, %.17g, %.17g\n', nodes['tags'], nodes['coords'])
+        written = []
+        for gmsh_type, (ccx_type, order) in CALCULIX_ELEMENT_TYPES.items():
+            if gmsh_type not in elements:
+                continue
+            block = elements[gmsh_type]
+            conn = block['conn'] if order is None else block['conn'][:, order]
+            f.write(f'*Element, type={ccx_type}\n'.encode())
+            _write_int_rows(f, block['tags'], conn)
+            written.append(block['tags'])
+        written = np.concatenate(written) if written else np.empty(0, dtype=np.int64)
         # Write element sets for each physical group
         for phys_id, name in phys_names.items():
             if phys_id in phys_sets:
-                f.write(f"*Elset, elset={name}\n")
-                f.write(','.join(map(str, phys_sets[phys_id])) + '\n')
-        # ...existing material, boundary, and coupling...
-        f.write('*MATERIAL, NAME=STEEL\n*ELASTIC\n210000, 0.3\n*DENSITY\n7850\n*CONDUCTIVITY\n45\n*SPECIFIC HEAT\n500\n')
-        f.write('*STEP\n*STATIC\n*END STEP\n')
+                tags = phys_sets[phys_id]
+                tags = tags[np.isin(tags, written)]
+                if len(tags):
+                    f.write(f"*Elset, elset={name}\n".encode())
+                    _write_id_list(f, tags)
 
 def load_config(config_path):
     with open(config_path, 'r') as f:
@@ -179,108 +909,1578 @@ def update_precice_xml(xml_path, mesh_files, interfaces):
     content = content.replace('SOLID_MESH', mesh_files['solid'])
     # Optionally, replace interface names if needed
     # Example: content = content.replace('NOZZLE_WALL', interfaces['nozzle_wall'])
-    with open(xml_path, 'w') as f:
+    with open_output(xml_path, 'w') as f:
         f.write(content)
 
-def generate_openfoam_boundary_field(patch_names, patch_type='preciceAdapter'):
+def generate_openfoam_boundary_field(patch_names, patch_type='preciceAdapter', processor_patches=False, constraint_types=None):
     bf = 'boundaryField\n{\n'
     for patch in patch_names:
-        bf += f'    {patch}\n    {{\n        type            {patch_type};\n    }}\n'
+        # constraint patches (symmetry, cyclicAMI) need the field type matching the patch type
+        bf += f'    {patch}\n    {{\n        type            {(constraint_types or {}).get(patch, patch_type)};\n    }}\n'
+    if processor_patches:
+        bf += '    "procBoundary.*"\n    {\n        type            processor;\n    }\n'
     bf += '}\n'
     return bf
 
-def write_openfoam_boundaries(output_dir, region, patch_names):
-    # Update 0/U and 0/p with all FSI patches
-    for field in ['U', 'p']:
-        file_path = os.path.join(output_dir, f'openfoam/{region}/0/{field}')
-        with open(file_path, 'w') as f:
-            f.write(generate_openfoam_boundary_field(patch_names))
+# Initial fields written by write_openfoam_boundaries (their templates are never copied)
+BOUNDARY_FIELDS = ('U', 'p')
+
+def write_openfoam_boundaries(output_dir, region, patch_names, constraint_types=None):
+    # Update 0/U and 0/p with all FSI patches (also in processor* directories of pre-decomposed cases)
+    case_dir = Path(output_dir) / f'openfoam/{region}'
+    processor_dirs = sorted(case_dir.glob('processor*'))
+    for field in BOUNDARY_FIELDS:
+        with open_output(case_dir / f'0/{field}', 'w') as f:
+            f.write(generate_openfoam_boundary_field(patch_names, constraint_types=constraint_types))
+        for proc_dir in processor_dirs:
+            os.makedirs(proc_dir / '0', exist_ok=True)
+            with open_output(proc_dir / f'0/{field}', 'w') as f:
+                f.write(generate_openfoam_boundary_field(patch_names, processor_patches=True, constraint_types=constraint_types))
+
+def node_index(nodes, tags):
+    """Map GMSH node tags to row indices of nodes['coords']."""
+    node_tags = nodes['tags']
+    n = len(node_tags)
+    if n and node_tags[0] == 1 and node_tags[-1] == n and np.all(np.diff(node_tags) == 1):
+        return np.asarray(tags, dtype=np.int64) - 1
+    order = np.argsort(node_tags, kind='stable')
+    return order[np.searchsorted(node_tags, tags, sorter=order)]
+
+# Rows of tets processed at once by the geometric kernels, bounding temporary memory
+GEOMETRY_CHUNK = 1 << 20
+
+def tet_signed_volumes(points, conn):
+    """Signed volumes of tetrahedra given point coordinates and (M, 4) point indices."""
+    vol = np.empty(len(conn))
+    for i in range(0, len(conn), GEOMETRY_CHUNK):
+        p = points[conn[i:i + GEOMETRY_CHUNK]]
+        a, b, c = p[:, 1] - p[:, 0], p[:, 2] - p[:, 0], p[:, 3] - p[:, 0]
+        vol[i:i + GEOMETRY_CHUNK] = np.einsum('ij,ij->i', np.cross(a, b), c) / 6.0
+    return vol
+
+# Corner nodes of each tetrahedron face, in CalculiX face order S1..S4
+CALCULIX_TET_FACES = np.array([[0, 1, 2], [0, 3, 1], [1, 3, 2], [2, 3, 0]])
+GMSH_TET_TYPES = (4, 11)
+GMSH_TRI_TYPES = (2, 9)
+
+def _face_keys(corners, base):
+    """Order-independent keys for rows of three node tags (tags must be < base)."""
+    corners = np.sort(corners, axis=1).astype(np.int64)
+    if base ** 3 < np.iinfo(np.int64).max:
+        return (corners[:, 0] * base + corners[:, 1]) * base + corners[:, 2]
+    # Too many nodes to pack a triplet into one int64: compare the raw 24-byte rows instead
+    return np.ascontiguousarray(corners).view(np.dtype((np.void, 24))).ravel()
+
+def build_tet_face_index(elements, base):
+    """Hash every tetrahedron face; return (sorted face keys, element tags, face numbers 1-4)."""
+    keys, tags, face_nums = [], [], []
+    for elem_type in GMSH_TET_TYPES:
+        if elem_type in elements:
+            block = elements[elem_type]
+            keys.append(_face_keys(block['conn'][:, CALCULIX_TET_FACES].reshape(-1, 3), base))
+            tags.append(np.repeat(block['tags'], 4))
+            face_nums.append(np.tile(np.arange(1, 5, dtype=np.int8), len(block['tags'])))
+    if not keys:
+        return _face_keys(np.empty((0, 3), dtype=np.int64), base), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+    keys = np.concatenate(keys)
+    order = np.argsort(keys, kind='stable')
+    return keys[order], np.concatenate(tags)[order], np.concatenate(face_nums)[order]
+
+def extract_calculix_surfaces(mesh, pattern, face_index=None):
+    """Match the triangles of every physical surface whose name matches pattern to tet faces.
+
+    Returns {physical name: (element tags, face numbers 1-4)} ready for
+    write_calculix_surfaces. Triangles are joined to the face index with a sort/searchsorted
+    pass, so the cost is linear in mesh size; a face shared by two tets resolves to the
+    first one. Pass a prebuilt face_index to reuse it across patterns.
+    """
+    base = int(mesh['nodes']['tags'].max()) + 1 if len(mesh['nodes']['tags']) else 1
+    if face_index is None:
+        face_index = build_tet_face_index(mesh['elements'], base)
+    face_keys, face_tags, face_nums = face_index
+    tris = [mesh['elements'][t] for t in GMSH_TRI_TYPES if t in mesh['elements']]
+    surfaces = {}
+    for phys_id, name in mesh['physical_names'].items():
+        if not re.search(pattern, name) or phys_id not in mesh['phys_sets']:
+            continue
+        corners = [b['conn'][np.isin(b['tags'], mesh['phys_sets'][phys_id]), :3] for b in tris]
+        corners = np.concatenate(corners) if corners else np.empty((0, 3), dtype=np.int64)
+        keys = _face_keys(corners, base)
+        pos = np.minimum(np.searchsorted(face_keys, keys), max(len(face_keys) - 1, 0))
+        found = face_keys[pos] == keys if len(face_keys) else np.zeros(len(keys), dtype=bool)
+        if not found.all():
+            print(f"Warning: {np.count_nonzero(~found)} faces of {name} do not belong to any tetrahedron")
+        surfaces[name] = (face_tags[pos[found]], face_nums[pos[found]])
+    return surfaces
+
+def write_calculix_surfaces(f, surfaces):
+    """Write an element-face *Surface for each {name: (element tags, face numbers)}.
+
+    Faces are grouped into one helper *Elset per face number (NAME_S1..NAME_S4) so the
+    element lists can be written in bulk. f must be opened in binary mode.
+    """
+    for name, (elems, faces) in surfaces.items():
+        lines = []
+        for face in range(1, 5):
+            selected = elems[faces == face]
+            if len(selected):
+                f.write(f"*Elset, elset={name}_S{face}\n".encode())
+                _write_id_list(f, selected)
+                lines.append(f"{name}_S{face}, S{face}\n")
+        if not lines:
+            print(f"Warning: surface {name} is empty and was not written")
+            continue
+        f.write((f"*Surface, name={name}, type=ELEMENT\n" + ''.join(lines)).encode())
+
+# Patches added by crop_sector on the cut planes at the start and end angle of the sector
+SECTOR_PATCHES = ('Sector_Start_Plane', 'Sector_End_Plane')
+# Nodes of each CalculiX tet face as a GMSH 6-node triangle: corners, then the mid-edge
+# nodes of GMSH tet10 (edges 01, 12, 02, 03, 23, 13 -> nodes 4..9)
+GMSH_TET10_FACE_NODES = np.array([[0, 1, 2, 4, 5, 6], [0, 3, 1, 7, 9, 4], [1, 3, 2, 9, 8, 5], [2, 3, 0, 8, 7, 6]])
+
+def polar_angle(points):
+    """Angle of points around the nozzle axis (x), from +y towards +z, in [-pi, pi]."""
+    return np.arctan2(points[..., 2], points[..., 1])
+
+def angular_range(points):
+    """(first angle, span): the smallest arc around the nozzle axis, starting at the first
+    angle, that contains every point off the axis."""
+    radius = np.hypot(points[:, 1], points[:, 2])
+    theta = np.sort(polar_angle(points[radius > 1e-9 * radius.max(initial=0.0)]))
+    if len(theta) < 2:
+        return 0.0, 0.0
+    gaps = np.diff(np.concatenate((theta, [theta[0] + 2 * np.pi])))
+    widest = np.argmax(gaps)
+    return float(theta[(widest + 1) % len(theta)]), float(2 * np.pi - gaps[widest])
+
+# Angular tolerance (radians) of the sector window check
+SECTOR_ANGLE_TOLERANCE = 1e-9
+
+def _sector_offset(points, start):
+    """Angle of points past the sector start, in [-tol, 2 pi - tol); 0 for points on the axis."""
+    radius = np.hypot(points[:, 1], points[:, 2])
+    offset = np.mod(polar_angle(points) - start + SECTOR_ANGLE_TOLERANCE, 2 * np.pi) - SECTOR_ANGLE_TOLERANCE
+    return np.where(radius > 1e-9 * radius.max(initial=0.0), offset, 0.0)
+
+def rotate_about_axis(mesh, angle):
+    """Copy of a parsed mesh rotated by angle (radians) about the nozzle (x) axis."""
+    c, s = np.cos(angle), np.sin(angle)
+    coords = mesh['nodes']['coords'].copy()
+    coords[:, 1], coords[:, 2] = c * mesh['nodes']['coords'][:, 1] - s * mesh['nodes']['coords'][:, 2], s * mesh['nodes']['coords'][:, 1] + c * mesh['nodes']['coords'][:, 2]
+    return {**mesh, 'nodes': {**mesh['nodes'], 'coords': coords}}
+
+def _plane_offset(points, angle):
+    """Signed distance of points from the plane through the nozzle axis at angle (radians),
+    r sin(theta - angle): positive on the side the angle grows towards."""
+    return points[..., 2] * np.cos(angle) - points[..., 1] * np.sin(angle)
+
+# Mid-edge nodes of a GMSH tet10 (4..9) and tri6 (3..5), as the corners of their edges
+GMSH_TET10_EDGES = np.array([[0, 1], [1, 2], [0, 2], [0, 3], [2, 3], [1, 3]])
+GMSH_TRI6_EDGES = np.array([[0, 1], [1, 2], [0, 2]])
+
+# Part of a tet / triangle on the positive side of a cutting plane, by (nodes on that side,
+# nodes on the plane) with the nodes sorted positive, zero, negative: its shape and vertices,
+# a corner position or (i, j), the point where edge i-j crosses the plane
+TET_CUT_PIECES = {
+    (1, 0): ('tet', [0, (0, 1), (0, 2), (0, 3)]),
+    (1, 1): ('tet', [0, 1, (0, 2), (0, 3)]),
+    (1, 2): ('tet', [0, 1, 2, (0, 3)]),
+    (2, 0): ('prism', [0, (0, 2), (0, 3), 1, (1, 2), (1, 3)]),
+    (2, 1): ('pyramid', [0, 1, (1, 3), (0, 3), 2]),
+    (3, 0): ('prism', [0, 1, 2, (0, 3), (1, 3), (2, 3)]),
+}
+TRI_CUT_PIECES = {
+    (1, 0): ('tri', [0, (0, 1), (0, 2)]),
+    (1, 1): ('tri', [0, 1, (0, 2)]),
+    (2, 0): ('quad', [0, 1, (1, 2), (0, 2)]),
+}
+# Prism symmetries taking each vertex to position 0 (bottom 0 1 2, top 3 4 5 over them)
+PRISM_ROTATIONS = np.array([[0, 1, 2, 3, 4, 5], [1, 2, 0, 4, 5, 3], [2, 0, 1, 5, 3, 4],
+                            [3, 4, 5, 0, 1, 2], [4, 5, 3, 1, 2, 0], [5, 3, 4, 2, 0, 1]])
+
+def _simplices(kind, verts):
+    """Split (M, n) cut pieces into (M, s, 3 or 4) triangles / tets. Every quadrilateral face
+    is split along the diagonal from its lowest node index, so neighbouring pieces agree
+    (Dompierre et al., "How to subdivide pyramids, prisms and hexahedra into tetrahedra")."""
+    if kind in ('tet', 'tri'):
+        return verts[:, None]
+    if kind == 'prism':
+        verts = np.take_along_axis(verts, PRISM_ROTATIONS[verts.argmin(axis=1)], axis=1)
+        first = np.minimum(verts[:, 1], verts[:, 5]) < np.minimum(verts[:, 2], verts[:, 4])
+        return np.where(first[:, None, None], verts[:, [[0, 1, 2, 5], [0, 1, 5, 4], [0, 4, 5, 3]]],
+                        verts[:, [[0, 1, 2, 4], [0, 4, 2, 5], [0, 4, 5, 3]]])
+    first = np.minimum(verts[:, 0], verts[:, 2]) < np.minimum(verts[:, 1], verts[:, 3])
+    if kind == 'quad':
+        return np.where(first[:, None, None], verts[:, [[0, 1, 2], [0, 2, 3]]], verts[:, [[0, 1, 3], [1, 2, 3]]])
+    return np.where(first[:, None, None], verts[:, [[0, 1, 2, 4], [0, 2, 3, 4]]], verts[:, [[0, 1, 3, 4], [1, 2, 3, 4]]])
+
+def _split_cells(conn, sign, cut_point):
+    """Split the tets or triangles in conn (corner point indices) that straddle a plane, given
+    the side of every corner (sign: -1, 0, 1) and cut_point(u, v), the point index where
+    edges u-v cross it. Returns the cells on either side and the conn row each came from."""
+    tables = TET_CUT_PIECES if conn.shape[1] == 4 else TRI_CUT_PIECES
+    straddle = (sign > 0).any(axis=1) & (sign < 0).any(axis=1)
+    cells, parents = [conn[~straddle]], [np.flatnonzero(~straddle)]
+    rows = np.flatnonzero(straddle)
+    for side in (1, -1):
+        order = np.argsort(-side * sign[rows], axis=1, kind='stable')
+        corners = np.take_along_axis(conn[rows], order, axis=1)
+        signs = np.take_along_axis(side * sign[rows], order, axis=1)
+        pattern = np.count_nonzero(signs > 0, axis=1), np.count_nonzero(signs == 0, axis=1)
+        for (n_pos, n_zero), (kind, spec) in tables.items():
+            mine = (pattern[0] == n_pos) & (pattern[1] == n_zero)
+            if not mine.any():
+                continue
+            c = corners[mine]
+            verts = np.stack([c[:, v] if isinstance(v, int) else cut_point(c[:, v[0]], c[:, v[1]]) for v in spec], axis=1)
+            pieces = _simplices(kind, verts)
+            cells.append(pieces.reshape(-1, conn.shape[1]))
+            parents.append(np.repeat(rows[mine], pieces.shape[1]))
+    return np.concatenate(cells), np.concatenate(parents)
+
+def _split_by_plane(points, cells, angle, fixed):
+    """Split the tets and triangles of cells ({type: {'conn', 'parent'}}, corner point indices)
+    by the plane through the nozzle axis at angle. Points closer to the plane than a quarter of
+    their shortest tet edge (and not in fixed) are first projected onto it unless that
+    squashes a tet, so the cut leaves no slivers. Returns the new points, the new cells and
+    a mask of the points on the plane."""
+    normal = np.array([0.0, -np.sin(angle), np.cos(angle)])
+    offset = _plane_offset(points, angle)
+    tets = np.concatenate([cells[t]['conn'] for t in GMSH_TET_TYPES if t in cells]) if any(t in cells for t in GMSH_TET_TYPES) else np.empty((0, 4), dtype=np.int64)
+    edges = tets[:, GMSH_TET10_EDGES].reshape(-1, 2)
+    shortest = np.full(len(points), np.inf)
+    np.minimum.at(shortest, edges.ravel(), np.repeat(np.linalg.norm(points[edges[:, 0]] - points[edges[:, 1]], axis=1), 2))
+    moved = np.flatnonzero(~fixed & (np.abs(offset) < 0.25 * shortest))
+    near = tets[np.isin(tets, moved).any(axis=1)]
+    before = tet_signed_volumes(points, near)
+    trial = points.copy()
+    while len(moved):
+        trial[moved] = points[moved] - offset[moved, None] * normal
+        after = tet_signed_volumes(trial, near)
+        bad = after * np.sign(before) <= 0.05 * np.abs(before)
+        if not bad.any():
+            break
+        restore = np.intersect1d(near[bad], moved)
+        trial[restore] = points[restore]
+        moved = np.setdiff1d(moved, restore)
+    points = trial
+    offset[moved] = 0.0
+    sign = np.where(np.abs(offset) <= 1e-12 * np.abs(points).max(initial=1.0), 0, np.sign(offset)).astype(np.int8)
+
+    # One new point per edge crossing the plane, shared by every cell around the edge
+    edges = np.concatenate([cells[t]['conn'][:, GMSH_TET10_EDGES if t in GMSH_TET_TYPES else GMSH_TRI6_EDGES].reshape(-1, 2) for t in cells]) if cells else np.empty((0, 2), dtype=np.int64)
+    edges = np.sort(edges[sign[edges[:, 0]] * sign[edges[:, 1]] < 0], axis=1)
+    keys = np.unique(edges[:, 0] * len(points) + edges[:, 1])
+    u, v = keys // len(points), keys % len(points)
+    fraction = (offset[u] / (offset[u] - offset[v]))[:, None]
+    first_new = len(points)
+    points = np.concatenate((points, points[u] + fraction * (points[v] - points[u])))
+    cut_point = lambda a, b: first_new + np.searchsorted(keys, np.minimum(a, b) * first_new + np.maximum(a, b))
+
+    split = {}
+    for t, cell in cells.items():
+        conn, rows = _split_cells(cell['conn'], sign[cell['conn']], cut_point)
+        split[t] = {'conn': conn, 'parent': cell['parent'][rows]}
+    return points, split, np.concatenate((sign == 0, np.ones(len(keys), dtype=bool)))
+
+def crop_sector(mesh, start, width):
+    """Crop a parsed mesh to the angular sector [start, start + width] (radians) around x.
+
+    Tetrahedra and triangles crossing either cut plane are split along it into tets
+    (triangles), with new nodes where their edges cross it, so the cut surfaces are exactly
+    planar and conforming; nodes that nearly lie on a plane are first moved onto it to
+    avoid slivers. The pieces and all other elements are kept when their centroid lies in
+    the sector. Kept tet faces on the cut planes become the SECTOR_PATCHES surfaces (6-node
+    triangles for tet10; the new mid-edge nodes of split quadratic elements are placed
+    halfway along straight edges). Nodes and elements are renumbered 1..N.
+
+    A mesh that already fits in a narrower (or equal) arc is not cut: it is returned as
+    it is when that arc lies inside the sector, else rotated by a whole number of sector
+    widths (a rotation the sector model is periodic under, and the same for every region
+    of a consistent mesh set) into it. Otherwise, or when no such rotation fits it, the
+    mesh is cropped. Raises ValueError when nothing of the mesh lies in the sector.
+    """
+    if width >= 2 * np.pi:
+        return mesh
+    first, span = angular_range(mesh['nodes']['coords'])
+    fits = lambda m: _sector_offset(m['nodes']['coords'], start).max(initial=0.0) <= width + SECTOR_ANGLE_TOLERANCE
+    if span <= width * (1 + 1e-9):
+        if fits(mesh):
+            return mesh
+        periods = np.round((np.mod(start - first + np.pi, 2 * np.pi) - np.pi) / width)
+        if periods:
+            rotated = rotate_about_axis(mesh, periods * width)
+            if fits(rotated):
+                print(f"Rotated the mesh by {np.degrees(periods * width):g} degrees into the "
+                      f"[{np.degrees(start):g}, {np.degrees(start + width):g}] degree sector")
+                return rotated
+            mesh = rotated
+        print(f"Warning: the mesh spans {np.degrees(first):g} to {np.degrees(first + span):g} degrees, "
+              f"not inside the [{np.degrees(start):g}, {np.degrees(start + width):g}] degree sector; "
+              "cropping it (check simulation.sector_start_deg)")
+    nodes, elements = mesh['nodes'], mesh['elements']
+    coords = nodes['coords']
+    cells = {t: {'conn': node_index(nodes, block['conn'][:, :4 if t in GMSH_TET_TYPES else 3]), 'parent': np.arange(len(block['tags']))}
+             for t, block in elements.items() if t in GMSH_TET_TYPES + GMSH_TRI_TYPES}
+    points, on_plane = coords.astype(float), []
+    for angle in (start, start + width):
+        fixed = on_plane[0] if on_plane else np.zeros(len(points), dtype=bool)
+        points, cells, on = _split_by_plane(points, cells, angle, fixed)
+        on_plane = [np.concatenate((mask, np.zeros(len(on) - len(mask), dtype=bool))) for mask in on_plane] + [on]
+
+    def in_sector(centres):
+        after_start, before_end = _plane_offset(centres, start) >= 0, _plane_offset(centres, start + width) <= 0
+        # A sector up to half a turn is where both half-spaces meet, a wider one their union
+        return after_start & before_end if width <= np.pi else after_start | before_end
+
+    for t, cell in cells.items():
+        keep = in_sector(points[cell['conn']].mean(axis=1))
+        cell['conn'], cell['parent'] = cell['conn'][keep], cell['parent'][keep]
+        # Give every piece the orientation of the element it came from
+        parent = node_index(nodes, elements[t]['conn'][cell['parent'], :cell['conn'].shape[1]])
+        if t in GMSH_TET_TYPES:
+            flip = tet_signed_volumes(points, cell['conn']) * tet_signed_volumes(coords, parent) < 0
+        else:
+            normal = lambda p, c: np.cross(p[c[:, 1]] - p[c[:, 0]], p[c[:, 2]] - p[c[:, 0]])
+            flip = np.einsum('ij,ij->i', normal(points, cell['conn']), normal(coords, parent)) < 0
+        cell['conn'][flip] = cell['conn'][flip][:, [0, 2, 1, 3][:cell['conn'].shape[1]]]
+    if not any(len(cells[t]['conn']) for t in GMSH_TET_TYPES if t in cells):
+        raise ValueError(f"no tetrahedra of the mesh lie in the [{np.degrees(start):g}, {np.degrees(start + width):g}] degree sector")
+
+    # Cut faces: faces of kept tets on no other kept tet, with every corner on one plane,
+    # and not already a boundary triangle of the mesh
+    base = len(points) + 1
+    tri_keys = np.concatenate([_face_keys(cells[t]['conn'], base) for t in GMSH_TRI_TYPES if t in cells] or [_face_keys(np.empty((0, 3), dtype=np.int64), base)])
+    cut_faces = {}
+    for t in GMSH_TET_TYPES:
+        if t not in cells:
+            continue
+        faces = cells[t]['conn'][:, CALCULIX_TET_FACES].reshape(-1, 3)
+        keys = _face_keys(faces, base)
+        unique, counts = np.unique(keys, return_counts=True)
+        alone = (counts[np.searchsorted(unique, keys)] == 1) & ~np.isin(keys, tri_keys)
+        on_start, on_end = (mask[faces].all(axis=1) for mask in on_plane)
+        cut_faces[t] = np.flatnonzero(alone & on_start), np.flatnonzero(alone & on_end & ~on_start)
+
+    # Quadratic elements: mid-edge nodes of edges the cut left whole are kept (moved with
+    # their corners), those of new edges are placed halfway along them
+    quadratic = [t for t in (11, 9) if t in cells]
+    if quadratic:
+        n = len(points)
+        pairs = {11: GMSH_TET10_EDGES, 9: GMSH_TRI6_EDGES}
+        old = {t: node_index(nodes, elements[t]['conn']) for t in quadratic}
+        old_keys, first = np.unique(np.concatenate([np.sort(old[t][:, pairs[t]], axis=2).reshape(-1, 2) @ [n, 1] for t in quadratic]), return_index=True)
+        old_mids = np.concatenate([old[t][:, 4 if t == 11 else 3:].ravel() for t in quadratic])[first]
+        u, v = old_keys // n, old_keys % n
+        points[old_mids] = coords[old_mids] + (points[u] - coords[u] + points[v] - coords[v]) / 2
+        for mask, angle in zip(on_plane, (start, start + width)):
+            flat = old_mids[mask[u] & mask[v]]
+            points[flat] -= _plane_offset(points[flat], angle)[:, None] * [0.0, -np.sin(angle), np.cos(angle)]
+        keys = {t: np.sort(cells[t]['conn'][:, pairs[t]], axis=2) @ [n, 1] for t in quadratic}
+        missing = np.unique(np.concatenate([k[~np.isin(k, old_keys)] for k in keys.values()]))
+        points = np.concatenate((points, (points[missing // n] + points[missing % n]) / 2))
+        for t in quadratic:
+            pos = np.minimum(np.searchsorted(old_keys, keys[t]), len(old_keys) - 1)
+            mids = np.where(old_keys[pos] == keys[t], old_mids[pos], n + np.searchsorted(missing, keys[t]))
+            cells[t]['conn'] = np.concatenate((cells[t]['conn'], mids), axis=1)
+
+    # Compact and renumber elements (cut triangles last) and nodes
+    new_elements, old_tags = {}, []
+    next_tag = 1
+    for t, block in elements.items():
+        if t in cells:
+            conn, rows = cells[t]['conn'], cells[t]['parent']
+        else:
+            rows = np.flatnonzero(in_sector(coords[node_index(nodes, block['conn'])].mean(axis=1)))
+            conn = node_index(nodes, block['conn'][rows])
+        new_elements[t] = {'dim': block['dim'], 'tags': np.arange(next_tag, next_tag + len(rows)),
+                           'conn': conn, 'entities': block['entities'][rows]}
+        old_tags.append(block['tags'][rows])
+        next_tag += len(rows)
+    old_tags = np.concatenate(old_tags) if old_tags else np.empty(0, dtype=np.int64)
+    phys_sets = {phys_id: np.flatnonzero(np.isin(old_tags, tags)) + 1 for phys_id, tags in mesh['phys_sets'].items()}
+    physical_names = dict(mesh['physical_names'])
+    first_id = max(list(physical_names) + list(phys_sets) + [0]) + 1
+    for t, faces in cut_faces.items():
+        tri_type = 2 if t == 4 else 9
+        local = CALCULIX_TET_FACES if t == 4 else GMSH_TET10_FACE_NODES
+        block = new_elements.setdefault(tri_type, {'dim': 2, 'tags': np.empty(0, dtype=np.int64),
+                                                   'conn': np.empty((0, local.shape[1]), dtype=np.int64),
+                                                   'entities': np.empty(0, dtype=np.int64)})
+        for i, plane_faces in enumerate(faces):
+            tags = np.arange(next_tag, next_tag + len(plane_faces))
+            next_tag += len(plane_faces)
+            block['tags'] = np.concatenate((block['tags'], tags))
+            block['conn'] = np.concatenate((block['conn'], cells[t]['conn'][(plane_faces // 4)[:, None], local[plane_faces % 4]]))
+            block['entities'] = np.concatenate((block['entities'], np.zeros(len(tags), dtype=block['entities'].dtype)))
+            phys_sets[first_id + i] = np.concatenate((phys_sets.get(first_id + i, np.empty(0, dtype=np.int64)), tags))
+    for i, name in enumerate(SECTOR_PATCHES):
+        physical_names[first_id + i] = name
+        phys_sets.setdefault(first_id + i, np.empty(0, dtype=np.int64))
+
+    used = np.unique(np.concatenate([block['conn'].ravel() for block in new_elements.values()]))
+    for block in new_elements.values():
+        block['conn'] = np.searchsorted(used, block['conn']) + 1
+    return {
+        'physical_names': physical_names,
+        'nodes': {'tags': np.arange(1, len(used) + 1), 'coords': points[used]},
+        'elements': new_elements,
+        'phys_sets': phys_sets,
+    }
+
+RENUMBER_METHODS = ('rcm', 'hilbert', 'morton')
+# Bits per axis of the space-filling-curve keys (3 * 21 fits in a uint64)
+SFC_BITS = 21
+
+def bandwidth_profile(cliques, n):
+    """Bandwidth and profile (envelope size) of the symmetric n x n matrix coupling all
+    indices within each row of every (M, k) array in cliques (elements, face pairs)."""
+    bandwidth = 0
+    row_min = np.arange(n)
+    for rows in cliques:
+        if not len(rows):
+            continue
+        lo, hi = rows.min(axis=1), rows.max(axis=1)
+        bandwidth = max(bandwidth, int((hi - lo).max()))
+        np.minimum.at(row_min, rows.ravel(), np.repeat(lo, rows.shape[1]))
+    return bandwidth, int((np.arange(n) - row_min).sum())
+
+def _adjacency_csr(cliques, n):
+    """CSR adjacency (indptr, indices) of the graph linking all indices within each clique row."""
+    src, dst = [], []
+    for rows in cliques:
+        i, j = np.triu_indices(rows.shape[1], 1)
+        src += [rows[:, i].ravel(), rows[:, j].ravel()]
+        dst += [rows[:, j].ravel(), rows[:, i].ravel()]
+    keys = np.concatenate(src).astype(np.int64) * n + np.concatenate(dst) if src else np.empty(0, dtype=np.int64)
+    # Sort and drop repeats in place; np.unique hashes the keys first, several times slower here
+    keys.sort()
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+    src, dst = keys // n, keys % n
+    src, dst = src[src != dst], dst[src != dst]
+    return np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n)))), dst
 
-def write_calculix_surfaces(f, fsi_sets):
-    # Write *Elset and *Surface for each FSI interface
-    for name, elems in fsi_sets.items():
-        f.write(f"*Elset, elset={name}\n")
-        f.write(','.join(map(str, elems)) + '\n')
-        f.write(f"*Surface, name={name}, type=ELEMENT\n{name}, S1\n")
+def _cuthill_mckee_levels(indptr, indices, degree, seed, visited):
+    """Cuthill-McKee BFS from seed, one level at a time: each node's unvisited neighbours
+    follow in order of the parent that reaches them first, then by increasing degree.
+    Marks the component in visited and returns its levels."""
+    visited[seed] = True
+    levels = [np.array([seed])]
+    while True:
+        frontier = levels[-1]
+        counts = degree[frontier]
+        starts = np.repeat(indptr[frontier] - np.cumsum(counts) + counts, counts)
+        neighbours = indices[starts + np.arange(counts.sum())]
+        parents = np.repeat(np.arange(len(frontier)), counts)
+        fresh = ~visited[neighbours]
+        neighbours, first = np.unique(neighbours[fresh], return_index=True)
+        if not len(neighbours):
+            return levels
+        level = neighbours[np.lexsort((degree[neighbours], parents[fresh][first]))]
+        visited[level] = True
+        levels.append(level)
+
+def reverse_cuthill_mckee(indptr, indices):
+    """Reverse Cuthill-McKee permutation (new position -> old index) of a CSR graph, with
+    a pseudo-peripheral start node per connected component. Uses scipy's compiled
+    implementation when scipy is installed, else a level-by-level NumPy BFS in which
+    isolated nodes go last."""
+    n = len(indptr) - 1
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import reverse_cuthill_mckee as scipy_rcm
+    except ImportError:
+        pass
+    else:
+        graph = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+        return scipy_rcm(graph, symmetric_mode=True).astype(np.int64)
+    degree = np.diff(indptr)
+    visited = degree == 0
+    order = []
+    for seed in np.argsort(degree, kind='stable'):
+        if visited[seed]:
+            continue
+        # Move the start to a pseudo-peripheral node: the lowest-degree node of the last level
+        depth = 0
+        while True:
+            levels = _cuthill_mckee_levels(indptr, indices, degree, seed, visited.copy())
+            if len(levels) <= depth:
+                break
+            depth = len(levels)
+            seed = levels[-1][np.argmin(degree[levels[-1]])]
+        order += _cuthill_mckee_levels(indptr, indices, degree, seed, visited)
+    order.append(np.flatnonzero(degree == 0)[::-1])
+    return np.concatenate(order)[::-1]
+
+def _spread_bits(v):
+    """Spread the low 21 bits of v so two zero bits separate consecutive bits."""
+    v = v.astype(np.uint64)
+    for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff), (8, 0x100f00f00f00f00f),
+                        (4, 0x10c30c30c30c30c3), (2, 0x1249249249249249)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+def _grid_coordinates(points, bits=SFC_BITS):
+    """Integer coordinates of points on a 2**bits grid over their bounding cube."""
+    lo = points.min(axis=0)
+    span = max(float((points.max(axis=0) - lo).max()), np.finfo(float).tiny)
+    return [((points[:, i] - lo[i]) / span * ((1 << bits) - 1)).astype(np.uint64) for i in range(3)]
+
+def morton_keys(points, bits=SFC_BITS):
+    """Morton (Z-order) curve index of 3D points."""
+    x, y, z = _grid_coordinates(points, bits)
+    return (_spread_bits(x) << np.uint64(2)) | (_spread_bits(y) << np.uint64(1)) | _spread_bits(z)
+
+def hilbert_keys(points, bits=SFC_BITS):
+    """Hilbert curve index of 3D points (Skilling's axes-to-transpose algorithm, vectorised)."""
+    x = _grid_coordinates(points, bits)
+    q = 1 << (bits - 1)
+    while q > 1:
+        p, qq = np.uint64(q - 1), np.uint64(q)
+        for i in range(3):
+            flip = (x[i] & qq) != 0
+            x[0] = np.where(flip, x[0] ^ p, x[0])
+            t = np.where(flip, np.uint64(0), (x[0] ^ x[i]) & p)
+            x[0] ^= t
+            x[i] ^= t
+        q >>= 1
+    x[1] ^= x[0]
+    x[2] ^= x[1]
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[2] & np.uint64(q)) != 0, t ^ np.uint64(q - 1), t)
+        q >>= 1
+    x = [xi ^ t for xi in x]
+    return (_spread_bits(x[0]) << np.uint64(2)) | (_spread_bits(x[1]) << np.uint64(1)) | _spread_bits(x[2])
+
+def _tet_face_pairs(tets, n_nodes):
+    """(F, 2) indices of tetrahedra (rows of tets) sharing a face: the cell graph of the mesh."""
+    keys = _face_keys(tets[:, CALCULIX_TET_FACES].reshape(-1, 3), n_nodes)
+    order = np.argsort(keys, kind='stable')
+    shared = np.flatnonzero(keys[order][1:] == keys[order][:-1])
+    return np.column_stack((order[shared] // 4, order[shared + 1] // 4))
+
+def renumber_mesh(mesh, method='rcm'):
+    """Renumber nodes and elements of a parsed mesh to reduce matrix bandwidth.
+
+    'rcm' applies Reverse Cuthill-McKee to the node graph (CalculiX) and to the tet face
+    graph (OpenFOAM cells); 'hilbert' and 'morton' sort nodes and tet centroids along a
+    space-filling curve. Other elements follow their lowest new node number. Tags become
+    1..N in the new order and physical groups are remapped.
+
+    Returns (mesh, report) with report = {'nodes'|'cells': (bandwidth, profile, new
+    bandwidth, new profile)}.
+    """
+    if method not in RENUMBER_METHODS:
+        raise ValueError(f"unknown renumbering method {method!r}; expected one of {RENUMBER_METHODS}")
+    nodes, elements = mesh['nodes'], mesh['elements']
+    n_nodes = len(nodes['tags'])
+    volumes = [node_index(nodes, b['conn']) for b in elements.values() if b['dim'] == 3]
+    tet_types = [t for t in GMSH_TET_TYPES if t in elements]
+    tets = np.concatenate([node_index(nodes, elements[t]['conn'][:, :4]) for t in tet_types]) if tet_types else np.empty((0, 4), dtype=np.int64)
+    pairs = _tet_face_pairs(tets, n_nodes)
+
+    if method == 'rcm':
+        node_order = reverse_cuthill_mckee(*_adjacency_csr(volumes, n_nodes))
+        cell_order = reverse_cuthill_mckee(*_adjacency_csr([pairs], len(tets)))
+    else:
+        keys = hilbert_keys if method == 'hilbert' else morton_keys
+        node_order = np.argsort(keys(nodes['coords']), kind='stable')
+        centroids = sum(nodes['coords'][tets[:, i]] for i in range(4)) / 4 if len(tets) else np.empty((0, 3))
+        cell_order = np.argsort(keys(centroids), kind='stable') if len(tets) else np.empty(0, dtype=np.int64)
+    new_node = np.empty(n_nodes, dtype=np.int64)
+    new_node[node_order] = np.arange(n_nodes)
+    cell_rank = np.empty(len(tets), dtype=np.int64)
+    cell_rank[cell_order] = np.arange(len(tets))
+
+    new_elements, old_tags = {}, []
+    next_tag, offset = 1, {t: o for t, o in zip(tet_types, np.cumsum([0] + [len(elements[t]['tags']) for t in tet_types]))}
+    for t, block in elements.items():
+        conn = new_node[node_index(nodes, block['conn'])]
+        if t in offset:
+            order = np.argsort(cell_rank[offset[t]:offset[t] + len(block['tags'])], kind='stable')
+        else:
+            order = np.argsort(conn.min(axis=1), kind='stable')
+        new_elements[t] = {'dim': block['dim'], 'tags': np.arange(next_tag, next_tag + len(order)),
+                           'conn': conn[order] + 1, 'entities': block['entities'][order]}
+        old_tags.append(block['tags'][order])
+        next_tag += len(order)
+    old_tags = np.concatenate(old_tags) if old_tags else np.empty(0, dtype=np.int64)
+    tag_order = np.argsort(old_tags, kind='stable')
+    phys_sets = {}
+    for phys_id, tags in mesh['phys_sets'].items():
+        tags = tags[np.isin(tags, old_tags)]
+        phys_sets[phys_id] = tag_order[np.searchsorted(old_tags, tags, sorter=tag_order)] + 1
+
+    report = {
+        'nodes': bandwidth_profile(volumes, n_nodes) + bandwidth_profile([new_node[c] for c in volumes], n_nodes),
+        'cells': bandwidth_profile([pairs], len(tets)) + bandwidth_profile([cell_rank[pairs]], len(tets)),
+    }
+    renumbered = {
+        'physical_names': mesh['physical_names'],
+        'nodes': {'tags': np.arange(1, n_nodes + 1), 'coords': nodes['coords'][node_order]},
+        'elements': new_elements,
+        'phys_sets': phys_sets,
+    }
+    return renumbered, report
+
+def format_renumber_report(region, method, report):
+    """Render a renumber_mesh report, one line per matrix."""
+    lines = [f"Renumbered {region} ({method}):"]
+    for what, (bandwidth, profile, new_bandwidth, new_profile) in report.items():
+        lines.append(f"  {what:<6} bandwidth {bandwidth} -> {new_bandwidth}, profile {profile} -> {new_profile}")
+    return '\n'.join(lines) + '\n'
+
+# Outward faces (right-hand rule) of a positively oriented tetrahedron
+OPENFOAM_TET_FACES = np.array([[0, 2, 1], [0, 1, 3], [1, 2, 3], [0, 3, 2]])
+OPENFOAM_DEFAULT_PATCH = 'defaultFaces'
+
+def build_polymesh(mesh):
+    """Derive OpenFOAM polyMesh arrays from the tetrahedra and physical surfaces of a parsed mesh.
+
+    Faces are matched with one sort over hashed corner triplets: keys occurring twice are
+    internal faces (owner = lower cell, oriented out of the owner, in upper-triangular
+    order), keys occurring once are boundary faces grouped into one patch per physical
+    surface, with unclaimed faces collected in OPENFOAM_DEFAULT_PATCH.
+
+    Returns {'points', 'faces' (F, 3), 'owner', 'neighbour', 'patches': [(name, nFaces, startFace)]}.
+    """
+    tets = [mesh['elements'][t]['conn'][:, :4] for t in GMSH_TET_TYPES if t in mesh['elements']]
+    if not tets:
+        raise ValueError("mesh has no tetrahedra to convert")
+    used, conn = np.unique(node_index(mesh['nodes'], np.concatenate(tets)), return_inverse=True)
+    conn = conn.reshape(-1, 4)
+    points = mesh['nodes']['coords'][used]
+    inverted = tet_signed_volumes(points, conn) < 0
+    conn[inverted, 1], conn[inverted, 2] = conn[inverted, 2], conn[inverted, 1].copy()
+
+    faces = conn[:, OPENFOAM_TET_FACES].reshape(-1, 3)
+    cells = np.repeat(np.arange(len(conn)), 4)
+    keys = _face_keys(faces, len(points))
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    pair = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1])
+    if len(pair) > 1 and np.any(pair[1:] == pair[:-1] + 1):
+        raise ValueError("non-manifold mesh: a face is shared by more than two cells")
+    internal = np.zeros(len(order), dtype=bool)
+    internal[pair] = internal[pair + 1] = True
+
+    owner_int, neighbour = cells[order[pair]], cells[order[pair + 1]]
+    upper = np.lexsort((neighbour, owner_int))
+    int_faces = order[pair][upper]
+    owner_int, neighbour = owner_int[upper], neighbour[upper]
+
+    bnd_faces = order[~internal]
+    bnd_keys = sorted_keys[~internal]  # already sorted
+    patch_of = np.full(len(bnd_faces), -1, dtype=np.int32)
+    point_of_node = np.full(len(mesh['nodes']['tags']), -1, dtype=np.int64)
+    point_of_node[used] = np.arange(len(used))
+    tris = [mesh['elements'][t] for t in GMSH_TRI_TYPES if t in mesh['elements']]
+    names = []
+    for phys_id, name in sorted(mesh['physical_names'].items()):
+        if phys_id not in mesh['phys_sets']:
+            continue
+        corners = [b['conn'][np.isin(b['tags'], mesh['phys_sets'][phys_id]), :3] for b in tris]
+        corners = point_of_node[node_index(mesh['nodes'], np.concatenate(corners))] if corners else np.empty((0, 3), dtype=np.int64)
+        corners = corners[np.all(corners >= 0, axis=1)]
+        if not len(corners):
+            continue
+        tri_keys = _face_keys(corners, len(points))
+        pos = np.minimum(np.searchsorted(bnd_keys, tri_keys), len(bnd_keys) - 1)
+        hit = pos[bnd_keys[pos] == tri_keys]
+        hit = hit[patch_of[hit] < 0]
+        if len(hit):
+            patch_of[hit] = len(names)
+            names.append(name)
+    if np.any(patch_of < 0):
+        patch_of[patch_of < 0] = len(names)
+        names.append(OPENFOAM_DEFAULT_PATCH)
+    by_patch = np.argsort(patch_of, kind='stable')
+    bnd_faces = bnd_faces[by_patch]
+    counts = np.bincount(patch_of, minlength=len(names))
+    starts = len(int_faces) + np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    all_faces = np.concatenate((int_faces, bnd_faces))
+    return {
+        'points': points,
+        'faces': faces[all_faces],
+        'owner': cells[all_faces],
+        'neighbour': neighbour,
+        'patches': [(name, int(n), int(start)) for name, n, start in zip(names, counts, starts)],
+    }
+
+def _foam_header(foam_class, obj, binary, label_bytes=4, note=None, location='constant/polyMesh'):
+    lines = ['FoamFile', '{', '    version     2.0;', f"    format      {'binary' if binary else 'ascii'};"]
+    if binary:
+        lines.append(f'    arch        "LSB;label={8 * label_bytes};scalar=64";')
+    lines += [f'    class       {foam_class};', f'    location    "{location}";']
+    if note:
+        lines.append(f'    note        "{note}";')
+    lines += [f'    object      {obj};', '}', '', '']
+    return '\n'.join(lines).encode()
+
+def _write_foam_binary_list(f, arr):
+    f.write(f'{len(arr)}\n('.encode())
+    f.write(arr.tobytes())
+    f.write(b')\n')
+
+def _polymesh_label_dtype(polymesh):
+    n = max(len(polymesh['points']), 3 * len(polymesh['faces']) + 1)
+    return np.dtype(_index_dtype(n)).newbyteorder('<')
+
+def write_foam_label_list(path, obj, labels, binary=False, label_t=np.dtype('<i4'), note=None, location='constant/polyMesh'):
+    """Write an OpenFOAM labelList file (owner, neighbour, *ProcAddressing, cellDecomposition)."""
+    labels = np.asarray(labels)
+    with open_output(path, 'wb', buffering=1 << 20) as f:
+        f.write(_foam_header('labelList', obj, binary, label_t.itemsize, note, location))
+        if binary:
+            _write_foam_binary_list(f, labels.astype(label_t))
+            return
+        f.write(f'{len(labels)}\n(\n'.encode())
+        if len(labels) and labels.min() < 0:
+            _write_chunked(f, '%d\n', labels)
+        else:
+            _write_int_rows(f, labels)
+        f.write(b')\n')
+
+def polymesh_n_cells(polymesh):
+    """Number of cells of a polyMesh; the last cell may appear only as a neighbour."""
+    if not len(polymesh['owner']):
+        return 0
+    return int(max(polymesh['owner'].max(), polymesh['neighbour'].max(initial=0))) + 1
+
+def _format_boundary_entries(patches):
+    """Format polyMesh boundary entries for (name, nFaces, startFace[, extra keywords]) tuples."""
+    entries = []
+    for name, n, start, *extra in patches:
+        extra = dict(extra[0]) if extra else {}
+        lines = [f"        type            {extra.pop('type', 'patch')};"]
+        lines += [f"        {key:<16}{value};" for key, value in extra.items() if key == 'inGroups']
+        lines += [f"        nFaces          {n};", f"        startFace       {start};"]
+        lines += [f"        {key:<16}{value};" for key, value in extra.items() if key != 'inGroups']
+        entries.append(f"    {name}\n    {{\n" + '\n'.join(lines) + "\n    }\n")
+    return f"{len(entries)}\n(\n{''.join(entries)})\n"
+
+def write_openfoam_polymesh(polymesh, mesh_dir, binary=False):
+    """Write points, faces, owner, neighbour and boundary of a build_polymesh result into mesh_dir.
+
+    Patch tuples may carry a fourth element, a dict of extra boundary keywords (used for
+    processor patches).
+    """
+    os.makedirs(mesh_dir, exist_ok=True)
+    label_t = _polymesh_label_dtype(polymesh)
+    n_cells = polymesh_n_cells(polymesh)
+    note = f"nPoints:{len(polymesh['points'])} nCells:{n_cells} nFaces:{len(polymesh['faces'])} nInternalFaces:{len(polymesh['neighbour'])}"
+    with open_output(Path(mesh_dir) / 'points', 'wb', buffering=1 << 20) as f:
+        f.write(_foam_header('vectorField', 'points', binary, label_t.itemsize))
+        if binary:
+            _write_foam_binary_list(f, polymesh['points'].astype('<f8'))
+        else:
+            f.write(f"{len(polymesh['points'])}\n(\n".encode())
+            _write_chunked(f, '(%.17g %.17g %.17g)\n', polymesh['points'])
+            f.write(b')\n')
+    with open_output(Path(mesh_dir) / 'faces', 'wb', buffering=1 << 20) as f:
+        faces = polymesh['faces']
+        if binary:
+            f.write(_foam_header('faceCompactList', 'faces', binary, label_t.itemsize))
+            _write_foam_binary_list(f, np.arange(0, 3 * len(faces) + 1, 3, dtype=label_t))
+            _write_foam_binary_list(f, faces.astype(label_t).ravel())
+        else:
+            f.write(_foam_header('faceList', 'faces', binary, label_t.itemsize))
+            f.write(f'{len(faces)}\n(\n'.encode())
+            for i in range(0, len(faces), WRITE_CHUNK_ROWS):
+                f.write(_format_int_rows(faces[i:i + WRITE_CHUNK_ROWS], b' ', b'3(', b')\n'))
+            f.write(b')\n')
+    for obj in ('owner', 'neighbour'):
+        write_foam_label_list(Path(mesh_dir) / obj, obj, polymesh[obj], binary, label_t, note)
+    with open_output(Path(mesh_dir) / 'boundary', 'wb') as f:
+        f.write(_foam_header('polyBoundaryMesh', 'boundary', False))
+        f.write(_format_boundary_entries(polymesh['patches']).encode())
+
+def read_polymesh_patch_names(mesh_dir):
+    """Return the patch names listed in a polyMesh boundary file."""
+    with open(Path(mesh_dir) / 'boundary') as f:
+        return re.findall(r'^    (\S+)\n    \{', f.read(), flags=re.M)
+
+def read_polymesh_patch_types(mesh_dir):
+    """Return {patch name: type} from a polyMesh boundary file."""
+    with open(Path(mesh_dir) / 'boundary') as f:
+        return dict(re.findall(r'^    (\S+)\n    \{\n        type\s+(\S+);', f.read(), flags=re.M))
+
+def sector_patch_entries(patches, patch_type='symmetry'):
+    """Give the SECTOR_PATCHES of a polyMesh patch list their constraint type: 'symmetry',
+    or 'cyclicAMI' pairing both cut planes by rotation about the nozzle (x) axis."""
+    present = {name for name, n, *_ in patches if name in SECTOR_PATCHES and n}
+    if patch_type == 'cyclicAMI' and len(present) < 2:
+        print("Warning: cyclicAMI needs both sector cut planes; using symmetry patches instead")
+        patch_type = 'symmetry'
+    entries = []
+    for name, n, start, *extra in patches:
+        if name in SECTOR_PATCHES:
+            if patch_type == 'cyclicAMI':
+                extra = [{'type': 'cyclicAMI', 'inGroups': 'List<word> 1(cyclicAMI)',
+                          'neighbourPatch': SECTOR_PATCHES[1 - SECTOR_PATCHES.index(name)],
+                          'transform': 'rotational', 'rotationAxis': '(1 0 0)', 'rotationCentre': '(0 0 0)'}]
+            else:
+                extra = [{'type': 'symmetry', 'inGroups': 'List<word> 1(symmetry)'}]
+        entries.append((name, n, start, *extra))
+    return entries
+
+def polymesh_cell_centres(polymesh):
+    """Approximate cell centres as the mean of each cell's face centroids (exact for tets)."""
+    n_cells = polymesh_n_cells(polymesh)
+    n_int = len(polymesh['neighbour'])
+    face_centres = polymesh['points'][polymesh['faces']].mean(axis=1)
+    cells = np.concatenate((polymesh['owner'], polymesh['neighbour']))
+    counts = np.bincount(cells, minlength=n_cells)
+    centres = np.empty((n_cells, 3))
+    for axis in range(3):
+        w = np.concatenate((face_centres[:, axis], face_centres[:n_int, axis]))
+        centres[:, axis] = np.bincount(cells, weights=w, minlength=n_cells) / counts
+    return centres
+
+def partition_rcb(centres, nparts, weights=None):
+    """Recursive coordinate bisection: split cells along their longest extent so every
+    part carries (nearly) the same total weight. Returns the part of each cell."""
+    weights = np.ones(len(centres)) if weights is None else np.asarray(weights, dtype=np.float64)
+    parts = np.empty(len(centres), dtype=np.int32)
+    stack = [(np.arange(len(centres)), 0, nparts)]
+    while stack:
+        idx, first, n = stack.pop()
+        if n == 1 or len(idx) <= 1:
+            parts[idx] = first
+            continue
+        pts = centres[idx]
+        axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+        order = np.argsort(pts[:, axis], kind='stable')
+        n_left = n // 2
+        cum = np.cumsum(weights[idx[order]])
+        split = int(np.clip(np.searchsorted(cum, cum[-1] * n_left / n), 1, len(idx) - 1))
+        stack.append((idx[order[:split]], first, n_left))
+        stack.append((idx[order[split:]], first + n_left, n - n_left))
+    return parts
+
+def partition_metis(polymesh, nparts, weights=None):
+    """Partition the cell graph with METIS through the optional pymetis binding."""
+    import pymetis
+    n_cells = polymesh_n_cells(polymesh)
+    n_int = len(polymesh['neighbour'])
+    src = np.concatenate((polymesh['owner'][:n_int], polymesh['neighbour']))
+    dst = np.concatenate((polymesh['neighbour'], polymesh['owner'][:n_int]))
+    order = np.argsort(src, kind='stable')
+    xadj = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n_cells))))
+    # METIS takes integer weights; keep one decimal of the (possibly fractional) cell weights
+    vweights = None if weights is None else np.maximum(np.round(10 * np.asarray(weights)), 1).astype(np.int64)
+    _, membership = pymetis.part_graph(nparts, xadj=xadj, adjncy=dst[order], vweights=vweights)
+    return np.asarray(membership, dtype=np.int32)
+
+def partition_cells(polymesh, nparts, method='auto', weights=None):
+    """Assign every cell to one of nparts ranks with METIS ('metis', needs pymetis) or
+    recursive coordinate bisection ('rcb'); 'auto' uses METIS when available."""
+    if method in ('auto', 'metis'):
+        try:
+            return partition_metis(polymesh, nparts, weights)
+        except ImportError:
+            if method == 'metis':
+                print("pymetis is not installed; falling back to recursive coordinate bisection")
+    return partition_rcb(polymesh_cell_centres(polymesh), nparts, weights)
+
+def interface_cell_weights(polymesh, interface_patches, interface_weight='auto'):
+    """Partition weights 1 + interface_weight * (coupling faces of the cell), so ranks are
+    balanced on coupling work as well as on cells. 'auto' gives the coupling faces as much
+    total weight as the cells."""
+    n_cells = polymesh_n_cells(polymesh)
+    counts = np.zeros(n_cells)
+    for name, n, start, *_ in polymesh['patches']:
+        if name in interface_patches:
+            counts += np.bincount(polymesh['owner'][start:start + n], minlength=n_cells)
+    if interface_weight == 'auto':
+        interface_weight = n_cells / max(counts.sum(), 1)
+    return 1.0 + float(interface_weight) * counts
+
+def decomposition_report(subdomains, interface_patches):
+    """Per-rank cells, processor faces and coupling faces/vertices of a decomposition.
+    Vertices shared by two ranks count on both, as both map them."""
+    rows = []
+    for p, sub in enumerate(subdomains):
+        interface, proc_faces = [], 0
+        for name, n, start, *extra in sub['patches']:
+            if name in interface_patches:
+                interface.append(sub['faces'][start:start + n])
+            elif extra and extra[0].get('type') == 'processor':
+                proc_faces += n
+        interface = np.concatenate(interface) if interface else np.empty((0, 3), dtype=np.int64)
+        rows.append({'rank': p, 'cells': len(sub['cellProcAddressing']), 'processor_faces': proc_faces,
+                     'interface_faces': len(interface), 'interface_vertices': len(np.unique(interface))})
+    return rows
+
+def format_decomposition_report(region, rows):
+    """Render a decomposition_report as a table with max/mean imbalance factors."""
+    columns = ['cells', 'processor_faces', 'interface_faces', 'interface_vertices']
+    lines = [f"Decomposition of {region} ({len(rows)} ranks)", f"{'rank':>6}" + ''.join(f'{c:>20}' for c in columns)]
+    lines += [f"{row['rank']:>6}" + ''.join(f'{row[c]:>20}' for c in columns) for row in rows]
+    imbalance = []
+    for c in columns:
+        mean = sum(row[c] for row in rows) / len(rows)
+        imbalance.append(f"{max(row[c] for row in rows) / mean:>20.2f}" if mean else f"{'-':>20}")
+    lines.append(f"{'max/mean':>6}" + ''.join(imbalance))
+    return '\n'.join(lines) + '\n'
+
+def decompose_polymesh(polymesh, cell_proc, nprocs):
+    """Split a polyMesh into per-processor meshes as decomposePar would.
+
+    Faces are bucketed with one sort on (processor, kind, neighbour processor, global face).
+    Internal faces stay in upper-triangular order because local cell labels follow the
+    global ones; faces between two processors become procBoundary patches on both sides,
+    ordered by global face so the halves match, and flipped on the neighbour's side.
+
+    Returns one dict per processor with the polyMesh arrays plus the cell/face/point/
+    boundary ProcAddressing arrays.
+    """
+    owner, neighbour, faces = polymesh['owner'], polymesh['neighbour'], polymesh['faces']
+    n_int = len(neighbour)
+    face_ids = np.arange(len(faces))
+    patch_of = np.full(len(faces), -1, dtype=np.int64)
+    for i, (_, n, start, *_) in enumerate(polymesh['patches']):
+        patch_of[start:start + n] = i
+    p_own = cell_proc[owner]
+    p_nei = cell_proc[neighbour]
+    cut = p_own[:n_int] != p_nei
+    n_patches = len(polymesh['patches'])
+    internal, crossing = face_ids[:n_int][~cut], face_ids[:n_int][cut]
+    boundary = face_ids[n_int:]
+
+    def bucket(procs, kinds, others, faces_, flipped):
+        n = len(faces_)
+        return (procs, np.broadcast_to(kinds, n), np.broadcast_to(others, n), faces_, np.broadcast_to(flipped, n))
+
+    # kind: 0 internal, 1 + patch index for boundary faces, 1 + n_patches for processor faces
+    entries = [
+        bucket(p_own[internal], 0, 0, internal, False),
+        bucket(p_own[boundary], 1 + patch_of[boundary], 0, boundary, False),
+        bucket(p_own[crossing], 1 + n_patches, p_nei[cut], crossing, False),
+        bucket(p_nei[cut], 1 + n_patches, p_own[crossing], crossing, True),
+    ]
+    proc, kind, other, gface, flip = (np.concatenate(col) for col in zip(*entries))
+    order = np.lexsort((gface, other, kind, proc))
+    proc, kind, other, gface, flip = proc[order], kind[order], other[order], gface[order], flip[order]
+    bounds = np.searchsorted(proc, np.arange(nprocs + 1))
+
+    result = []
+    for p in range(nprocs):
+        sl = slice(bounds[p], bounds[p + 1])
+        k, o, g, fl = kind[sl], other[sl], gface[sl], flip[sl]
+        cells = np.flatnonzero(cell_proc == p)
+        local_owner = owner[g]
+        local_owner[fl] = neighbour[g[fl]]
+        local_faces = faces[g].copy()
+        local_faces[fl] = local_faces[fl][:, ::-1]
+        n_local_int = np.count_nonzero(k == 0)
+        point_ids, local_faces = np.unique(local_faces, return_inverse=True)
+        patches = []
+        boundary_addr = []
+        for i, (name, _, _, *extra) in enumerate(polymesh['patches']):
+            start, stop = np.searchsorted(k, [1 + i, 2 + i])
+            patches.append((name, int(stop - start), int(start), *extra))
+            boundary_addr.append(i)
+        proc_start = np.searchsorted(k, 1 + n_patches)
+        for q in np.unique(o[proc_start:]):
+            start, stop = proc_start + np.searchsorted(o[proc_start:], [q, q + 1])
+            patches.append((f'procBoundary{p}to{q}', int(stop - start), int(start), {
+                'type': 'processor', 'inGroups': 'List<word> 1(processor)', 'matchTolerance': '0.0001',
+                'transform': 'unknown', 'myProcNo': p, 'neighbProcNo': int(q)}))
+            boundary_addr.append(-1)
+        result.append({
+            'points': polymesh['points'][point_ids],
+            'faces': local_faces.reshape(-1, 3),
+            'owner': np.searchsorted(cells, local_owner),
+            'neighbour': np.searchsorted(cells, neighbour[g[:n_local_int]]),
+            'patches': patches,
+            'cellProcAddressing': cells,
+            'faceProcAddressing': np.where(fl, -(g + 1), g + 1),
+            'pointProcAddressing': point_ids,
+            'boundaryProcAddressing': np.array(boundary_addr),
+        })
+    return result
+
+def write_decomposed_case(polymesh, cell_proc, nprocs, case_dir, binary=False):
+    """Write processor*/constant/polyMesh (with ProcAddressing), constant/cellDecomposition
+    and a matching system/decomposeParDict so the case starts in parallel directly.
+    Returns the per-processor meshes of decompose_polymesh."""
+    label_t = _polymesh_label_dtype(polymesh)
+    subdomains = decompose_polymesh(polymesh, cell_proc, nprocs)
+    for p, sub in enumerate(subdomains):
+        mesh_dir = Path(case_dir) / f'processor{p}/constant/polyMesh'
+        write_openfoam_polymesh(sub, mesh_dir, binary)
+        for obj in ('cellProcAddressing', 'faceProcAddressing', 'pointProcAddressing', 'boundaryProcAddressing'):
+            write_foam_label_list(mesh_dir / obj, obj, sub[obj], binary, label_t)
+    for sub_dir in ('constant', 'system'):
+        os.makedirs(Path(case_dir) / sub_dir, exist_ok=True)
+    write_foam_label_list(Path(case_dir) / 'constant/cellDecomposition', 'cellDecomposition', cell_proc, binary, label_t, location='constant')
+    with open_output(Path(case_dir) / 'system/decomposeParDict', 'wb') as f:
+        f.write(_foam_header('dictionary', 'decomposeParDict', False, location='system'))
+        f.write(f"// Pre-decomposed by the generator; cellDecomposition keeps reconstructPar consistent\n"
+                f"numberOfSubdomains {nprocs};\n\nmethod          manual;\n\n"
+                f"coeffs\n{{\n    dataFile        \"cellDecomposition\";\n}}\n".encode())
+    return subdomains
+
+# Mesh quality thresholds (config mesh.quality); a threshold set to null is not checked
+MESH_QUALITY_DEFAULTS = {
+    'min_volume': 0.0,  # tets at or below this signed volume are inverted or degenerate
+    'max_aspect_ratio': 100.0,  # circumradius / (3 * inradius), 1 for a regular tet
+    'max_skewness': 0.98,  # equivolume skewness, 0 for a regular tet to 1 for a flat one
+    'max_non_orthogonality': 70.0,  # degrees, internal faces of fluid regions
+    'abort': False,  # stop generation when an element exceeds a threshold, instead of warning
+}
+QUALITY_METRICS = {
+    # metric: (threshold key, element fails when value > threshold, histogram bin edges)
+    'volume': ('min_volume', False, None),
+    'aspect_ratio': ('max_aspect_ratio', True, np.array([1, 1.5, 2, 3, 5, 10, 20, 50, 100, 1000, np.inf])),
+    'skewness': ('max_skewness', True, np.array([0, 0.25, 0.5, 0.7, 0.8, 0.9, 0.95, 0.98, 1.0])),
+    'non_orthogonality': ('max_non_orthogonality', True, np.array([0, 10, 20, 30, 40, 50, 60, 70, 80, 90])),
+}
+QUALITY_REPORT_ELEMENTS = 10  # offending element tags listed per group and metric in the text report
+
+def tet_shape_quality(points, conn):
+    """Aspect ratio (circumradius / 3 inradius) and equivolume skewness of tetrahedra.
+
+    Degenerate tets get an infinite aspect ratio and a skewness of 1.
+    """
+    aspect, skewness = np.empty(len(conn)), np.empty(len(conn))
+    for i in range(0, len(conn), GEOMETRY_CHUNK):
+        p = points[conn[i:i + GEOMETRY_CHUNK]]
+        a, b, c = p[:, 1] - p[:, 0], p[:, 2] - p[:, 0], p[:, 3] - p[:, 0]
+        bc, ca, ab = np.cross(b, c), np.cross(c, a), np.cross(a, b)
+        vol6 = np.abs(np.einsum('ij,ij->i', a, bc))
+        # Circumcentre relative to p0 is (|a|^2 bc + |b|^2 ca + |c|^2 ab) / (2 a.(b x c))
+        sq = lambda v: np.einsum('ij,ij->i', v, v)
+        centre = sq(a)[:, None] * bc + sq(b)[:, None] * ca + sq(c)[:, None] * ab
+        norm = lambda v: np.sqrt(sq(v))
+        twice_area = norm(ab) + norm(ca) + norm(bc) + norm(np.cross(b - a, c - a))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            radius = norm(centre) / (2 * vol6)
+            # inradius = 3 V / area = vol6 / twice_area
+            aspect[i:i + GEOMETRY_CHUNK] = np.where(vol6 > 0, radius * twice_area / (3 * vol6), np.inf)
+            # Volume of the regular tet with the same circumradius: 8 sqrt(3) / 27 R^3
+            ideal = 8 * np.sqrt(3) / 27 * radius ** 3
+            skewness[i:i + GEOMETRY_CHUNK] = np.where(vol6 > 0, 1 - vol6 / 6 / ideal, 1.0)
+    return aspect, np.clip(skewness, 0.0, 1.0)
+
+def face_non_orthogonality(polymesh, centres=None):
+    """Angle in degrees between each internal face normal and the owner-to-neighbour centre vector."""
+    if centres is None:
+        centres = polymesh_cell_centres(polymesh)
+    neighbour = polymesh['neighbour']
+    faces, owner = polymesh['faces'][:len(neighbour)], polymesh['owner'][:len(neighbour)]
+    angle = np.empty(len(neighbour))
+    for i in range(0, len(neighbour), GEOMETRY_CHUNK):
+        p = polymesh['points'][faces[i:i + GEOMETRY_CHUNK]]
+        normal = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+        delta = centres[neighbour[i:i + GEOMETRY_CHUNK]] - centres[owner[i:i + GEOMETRY_CHUNK]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos = np.einsum('ij,ij->i', normal, delta) / np.sqrt(np.einsum('ij,ij->i', normal, normal) * np.einsum('ij,ij->i', delta, delta))
+        angle[i:i + GEOMETRY_CHUNK] = np.degrees(np.arccos(np.clip(np.nan_to_num(cos, nan=-1.0), -1.0, 1.0)))
+    return angle
+
+def mesh_quality(mesh, thresholds, polymesh=None):
+    """Per-element quality metrics of the tetrahedra of a parsed mesh, grouped by volume
+    physical group.
+
+    Signed volume, aspect ratio and skewness are computed for every tet; with the region's
+    polyMesh (built from the same mesh, so cell i is tet i), each tet also gets the worst
+    non-orthogonality of its internal faces. Returns {'elements', 'thresholds', 'groups':
+    {name: {'elements', 'metrics': {metric: {'min', 'max', 'mean', 'histogram'}},
+    'offending': {metric: element tags}}}}, plus 'offending_cells' ({metric: polyMesh cell
+    labels}) per group with a polyMesh; elements outside every volume group are reported
+    under '(no volume group)'.
+    """
+    blocks = [mesh['elements'][t] for t in GMSH_TET_TYPES if t in mesh['elements']]
+    tags = np.concatenate([b['tags'] for b in blocks]) if blocks else np.empty(0, dtype=np.int64)
+    conn = node_index(mesh['nodes'], np.concatenate([b['conn'][:, :4] for b in blocks])) if blocks else np.empty((0, 4), dtype=np.int64)
+    points = mesh['nodes']['coords']
+    metrics = {'volume': tet_signed_volumes(points, conn)}
+    metrics['aspect_ratio'], metrics['skewness'] = tet_shape_quality(points, conn)
+    if polymesh is not None:
+        angle = face_non_orthogonality(polymesh)
+        worst = np.zeros(len(tags))
+        np.maximum.at(worst, polymesh['owner'][:len(angle)], angle)
+        np.maximum.at(worst, polymesh['neighbour'], angle)
+        metrics['non_orthogonality'] = worst
+
+    groups = []
+    grouped = np.zeros(len(tags), dtype=bool)
+    for phys_id, name in sorted(mesh['physical_names'].items()):
+        if phys_id in mesh['phys_sets']:
+            members = np.isin(tags, mesh['phys_sets'][phys_id])
+            if members.any():
+                groups.append((name, members))
+                grouped |= members
+    if not grouped.all():
+        groups.append(('(no volume group)', ~grouped))
+
+    result = {'elements': len(tags), 'thresholds': thresholds, 'groups': {}}
+    for name, members in groups:
+        group = {'elements': int(members.sum()), 'metrics': {}, 'offending': {}}
+        if polymesh is not None:
+            group['offending_cells'] = {}
+        for metric, values in metrics.items():
+            threshold_key, above, edges = QUALITY_METRICS[metric]
+            values = values[members]
+            finite = values[np.isfinite(values)]
+            group['metrics'][metric] = {
+                'min': float(values.min()), 'max': float(values.max()),
+                'mean': float(finite.mean()) if len(finite) else float('inf'),
+                'histogram': (edges.tolist(), np.histogram(np.clip(values, edges[0], edges[-1]), edges)[0].tolist()) if edges is not None else None,
+            }
+            threshold = thresholds.get(threshold_key)
+            if threshold is not None:
+                bad = values > threshold if above else values <= threshold
+                if bad.any():
+                    group['offending'][metric] = tags[members][bad]
+                    if polymesh is not None:
+                        group['offending_cells'][metric] = np.flatnonzero(members)[bad]
+        result['groups'][name] = group
+    return result
+
+def format_mesh_quality(region, quality):
+    """Render a mesh_quality result: per group, the range and histogram of each metric
+    and the first offending elements."""
+    lines = [f"Mesh quality of {region} ({quality['elements']} tetrahedra)"]
+    for name, group in quality['groups'].items():
+        lines.append(f"  {name} ({group['elements']} elements)")
+        for metric, stats in group['metrics'].items():
+            threshold_key, above, _ = QUALITY_METRICS[metric]
+            threshold = quality['thresholds'].get(threshold_key)
+            limit = '' if threshold is None else f" (limit {'<=' if above else '>'} {threshold:g})"
+            lines.append(f"    {metric:<18} min {stats['min']:.4g}  mean {stats['mean']:.4g}  max {stats['max']:.4g}{limit}")
+            if stats['histogram']:
+                edges, counts = stats['histogram']
+                lines.append('      ' + '  '.join(f"[{lo:g},{hi:g}):{n}" for lo, hi, n in zip(edges, edges[1:], counts) if n))
+        for metric, bad in group['offending'].items():
+            shown = ', '.join(str(t) for t in bad[:QUALITY_REPORT_ELEMENTS]) + (', ...' if len(bad) > QUALITY_REPORT_ELEMENTS else '')
+            lines.append(f"    FAILED {metric}: {len(bad)} elements: {shown}")
+    return '\n'.join(lines) + '\n'
+
+def check_mesh_quality(region, mesh, thresholds, report_dir, polymesh=None):
+    """Run mesh_quality on a region, print it and write mesh_quality.txt plus
+    mesh_quality.json (complete offending element lists) to report_dir. Raises ValueError
+    when an element exceeds a threshold and thresholds['abort'] is set, so no case is
+    emitted from a mesh the solvers would reject."""
+    with profile_stage('check_mesh_quality'):
+        quality = mesh_quality(mesh, thresholds, polymesh)
+        count('elements_checked', quality['elements'])
+        report = format_mesh_quality(region, quality)
+        with open_output(Path(report_dir) / 'mesh_quality.txt', 'w') as f:
+            f.write(report)
+        with open_output(Path(report_dir) / 'mesh_quality.json', 'w') as f:
+            listed = lambda offending: {metric: bad.tolist() for metric, bad in offending.items()}
+            json.dump({**quality, 'groups': {name: {**group, 'offending': listed(group['offending']),
+                                                    **({'offending_cells': listed(group['offending_cells'])} if 'offending_cells' in group else {})}
+                                             for name, group in quality['groups'].items()}}, f, indent=1)
+    print(report, end='')
+    failures = '; '.join(f"{name}: " + ', '.join(f"{len(bad)} beyond {metric}" for metric, bad in group['offending'].items())
+                         for name, group in quality['groups'].items() if group['offending'])
+    if failures:
+        message = f"Mesh quality check failed for {region} ({failures})"
+        if thresholds.get('abort'):
+            raise ValueError(message)
+        report_path = Path(MESH_DESTINATIONS[region]).parent if region in MESH_DESTINATIONS else Path(report_dir)
+        print(f"Warning: {message}; see {report_path / 'mesh_quality.txt'}")
+    return quality
 
 def update_precice_xml_interfaces(xml_path, interface_names):
     with open(xml_path, 'r') as f:
-        content = f.read()
+        original = f.read()
+    content = original
     for name in interface_names:
         content = content.replace(f'INTERFACE_{name}', name)
-    with open(xml_path, 'w') as f:
-        f.write(content)
+    if content != original:
+        with open_output(xml_path, 'w') as f:
+            f.write(content)
+
+# Coupling patches of each region, as matched by find_interfaces
+INTERFACE_PATTERNS = {
+    'solid': r'Nozzle_Outer_Wall',
+    'interior_fluid': r'Inner_Fluid_Outer_Wall',
+    'exterior_fluid': r'Nozzle_Outer_Wall',
+    'cooling_channel_fluid': r'Cooling_Channel_\d+_Entry_Wall',
+}
 
-def generate_project(mesh_files, output_dir, fraction_of_pi=1.0, config_path='config.yaml', combustion=False):
-    config = load_config(config_path)
-    config_flat = flatten_config(config)
+# Mesh of each region in the meshs/ directory, used when no paths are given
+DEFAULT_MESH_FILES = {
+    'solid': 'meshs/Solid_mesh.msh',
+    'interior_fluid': 'meshs/Inner_Fluid_mesh.msh',
+    'exterior_fluid': 'meshs/Outer_Fluid_mesh.msh',
+    'cooling_channel_fluid': 'meshs/Cooling_Channels_mesh.msh',
+}
+
+# Destination of each input mesh inside the generated project
+MESH_DESTINATIONS = {
+    'solid': 'calculix/mesh.msh',
+    'interior_fluid': 'openfoam/interior/mesh.msh',
+    'exterior_fluid': 'openfoam/exterior/mesh.msh',
+    'cooling_channel_fluid': 'openfoam/cooling_channel/mesh.msh',
+}
+
+def write_solid_surfaces(solid, out_path):
+    """Write CalculiX element-face surfaces for FSI: one per solid patch, plus the
+    NOZZLE_WALL/COOLING_WALL unions referenced by solid.inp."""
+    face_index = build_tet_face_index(solid['elements'], int(solid['nodes']['tags'].max()) + 1)
+    surfaces = {}
+    for alias, pattern in [('NOZZLE_WALL', r'Nozzle_Outer_Wall'), ('COOLING_WALL', r'Cooling_Channel_\d+_Entry_Wall')]:
+        patches = extract_calculix_surfaces(solid, pattern, face_index)
+        surfaces.update(patches)
+        if patches:
+            elems, faces = zip(*patches.values())
+            surfaces[alias] = (np.concatenate(elems), np.concatenate(faces))
+        else:
+            print(f"Warning: no solid surfaces match {pattern}; {alias} is undefined in solid.inp")
+    with open_output(out_path, 'wb') as f:
+        write_calculix_surfaces(f, surfaces)
+
+def write_calculix_sector_constraints(solid, out_path):
+    """Write the sector cut-plane node sets of a cropped solid with a cylindrical *TRANSFORM
+    about the nozzle (x) axis and zero circumferential displacement (symmetry). Uncropped
+    meshes get an include holding only a comment."""
+    ids = {name: phys_id for phys_id, name in solid['physical_names'].items()}
+    tris = [solid['elements'][t] for t in GMSH_TRI_TYPES if t in solid['elements']]
+    with open_output(out_path, 'wb') as f:
+        f.write(b'** Sector cut-plane symmetry, written by the generator\n')
+        for name in SECTOR_PATCHES:
+            tags = solid['phys_sets'].get(ids.get(name), [])
+            node_ids = np.unique(np.concatenate([b['conn'][np.isin(b['tags'], tags)].ravel() for b in tris])) if tris else []
+            if not len(node_ids):
+                continue
+            nset = name.upper()
+            f.write(f"*Nset, nset={nset}\n".encode())
+            _write_id_list(f, node_ids)
+            f.write(f"*Transform, nset={nset}, type=C\n0., 0., 0., 1., 0., 0.\n*Boundary\n{nset}, 2, 2\n".encode())
+
+def process_region(key, mesh_path, output_dir, options=None):
+    """Link (or copy), parse and convert one region mesh. Regions are independent of each other.
+
+    options: {'polymesh_format': 'ascii' | 'binary', 'decompose_ranks': int,
+              'decomposition_method': 'auto' | 'metis' | 'rcb', 'interface_weight': float | 'auto',
+              'sector': (start, width) in radians, 'sector_patch_type': 'symmetry' | 'cyclicAMI',
+              'renumber': None | 'rcm' | 'hilbert' | 'morton',
+              'quality': None | MESH_QUALITY_DEFAULTS-like thresholds}
+    Meshes are cropped to the sector around the nozzle axis and optionally renumbered for
+    bandwidth before conversion, then checked against the quality thresholds.
+    Fluid regions are pre-decomposed into processor* directories when decompose_ranks > 1,
+    with cells weighted by their coupling faces when interface_weight is non-zero.
+    """
+    with profile_stage(f'process_region {key}'):
+        return _process_region(key, mesh_path, output_dir, options or {})
+
+def _process_region(key, mesh_path, output_dir, options):
+    dest_path = Path(output_dir) / MESH_DESTINATIONS[key]
+    os.makedirs(dest_path.parent, exist_ok=True)
+    with profile_stage('link_mesh'):
+        link_or_copy(mesh_path, dest_path)
+    mesh = load_mesh(mesh_path)
+    if options.get('sector'):
+        full = mesh
+        with profile_stage('crop_sector'):
+            mesh = crop_sector(full, *options['sector'])
+        if mesh is not full:
+            n_volume = lambda m: sum(len(m['elements'][t]['tags']) for t in GMSH_TET_TYPES if t in m['elements'])
+            print(f"Cropped {key} to a {np.degrees(options['sector'][1]):g} degree sector: {n_volume(full)} -> {n_volume(mesh)} volume elements")
+    if options.get('renumber'):
+        with profile_stage('renumber_mesh'):
+            mesh, report = renumber_mesh(mesh, options['renumber'])
+        print(format_renumber_report(key, options['renumber'], report), end='')
+    if key == 'solid':
+        # CalculiX mesh automation (GMSH 4.x)
+        calculix_dir = Path(output_dir) / 'calculix'
+        if options.get('quality'):
+            check_mesh_quality(key, mesh, options['quality'], calculix_dir)
+        with profile_stage('write_calculix_inp'):
+            write_calculix_inp(mesh['nodes'], mesh['elements'], mesh['physical_names'], mesh['phys_sets'], calculix_dir / 'nozzle.inp')
+            count_bytes_written(calculix_dir / 'nozzle.inp')
+        with profile_stage('write_solid_surfaces'):
+            write_solid_surfaces(mesh, calculix_dir / 'surfaces.inp')
+            write_calculix_sector_constraints(mesh, calculix_dir / 'sector.inp')
+            count_bytes_written(calculix_dir / 'surfaces.inp', calculix_dir / 'sector.inp')
+    else:
+        # OpenFOAM mesh written directly, replacing gmshToFoam
+        binary = options.get('polymesh_format', 'ascii') == 'binary'
+        with profile_stage('build_polymesh'):
+            polymesh = build_polymesh(mesh)
+            polymesh['patches'] = sector_patch_entries(polymesh['patches'], options.get('sector_patch_type', 'symmetry'))
+            count('cells', polymesh_n_cells(polymesh))
+            count('faces', len(polymesh['faces']))
+        if options.get('quality'):
+            check_mesh_quality(key, mesh, options['quality'], dest_path.parent, polymesh)
+        with profile_stage('write_openfoam_polymesh'):
+            write_openfoam_polymesh(polymesh, dest_path.parent / 'constant/polyMesh', binary)
+            count_bytes_written(dest_path.parent / 'constant/polyMesh')
+        nprocs = options.get('decompose_ranks', 1)
+        if nprocs > 1:
+            # Partition here instead of running decomposePar before every run
+            interface_patches = find_interfaces(mesh['physical_names'], INTERFACE_PATTERNS[key])
+            interface_weight = options.get('interface_weight', 0)
+            with profile_stage('partition_cells'):
+                weights = interface_cell_weights(polymesh, interface_patches, interface_weight) if interface_weight else None
+                cell_proc = partition_cells(polymesh, nprocs, options.get('decomposition_method', 'auto'), weights)
+            with profile_stage('write_decomposed_case'):
+                subdomains = write_decomposed_case(polymesh, cell_proc, nprocs, dest_path.parent, binary)
+                count_bytes_written(*sorted(dest_path.parent.glob('processor*')))
+            report = format_decomposition_report(key, decomposition_report(subdomains, interface_patches))
+            with open_output(dest_path.parent / 'decomposition_report.txt', 'w') as f:
+                f.write(report)
+            print(report, end='')
+    return mesh
+
+@contextlib.contextmanager
+def open_output(path, mode='w', **kwargs):
+    """open() for writing a generated file without modifying an existing one in place: the
+    data goes to a temporary file next to path, renamed over it once complete. Outputs
+    hard-linked from a store, and so shared with other cases, are replaced rather than
+    rewritten. The file keeps the permissions of the one it replaces."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.chmod(tmp, os.stat(path).st_mode & 0o7777 if path.is_file() else 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def copy_output(src, dst):
+    """shutil.copy2 through open_output, so dst is replaced and never rewritten in place."""
+    with open(src, 'rb') as fsrc, open_output(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+    shutil.copystat(src, dst)
+
+def link_or_copy(src, dst):
+    """Hard-link src to dst (replacing dst), copying when linking is not possible. Nothing
+    is written when dst already is a link to src."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def link_tree(src_dir, dst_dir, skip=()):
+    """Hard-link every file under src_dir into the same place under dst_dir; skip lists
+    top-level file and directory names to leave out."""
+    for root, dirs, files in os.walk(src_dir):
+        rel = os.path.relpath(root, src_dir)
+        if rel == '.':
+            dirs[:] = [name for name in dirs if name not in skip]
+        os.makedirs(os.path.join(dst_dir, rel), exist_ok=True)
+        for name in files:
+            if rel != '.' or name not in skip:
+                link_or_copy(os.path.join(root, name), os.path.join(dst_dir, rel, name))
+
+def store_mesh_file(mesh_path, store_dir):
+    """Copy a mesh file into store_dir/meshes under its content hash (once) and return the
+    stored path."""
+    stored = Path(store_dir) / 'meshes' / f"{file_hash(mesh_path)}{Path(mesh_path).suffix}"
+    if not stored.is_file():
+        os.makedirs(stored.parent, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=stored.parent, suffix='.tmp')
+        os.close(fd)
+        shutil.copy2(mesh_path, tmp)
+        os.replace(tmp, stored)
+    return stored
+
+def store_key(key, mesh_path, options):
+    """Content address of the artefacts process_region derives from a mesh and its options."""
+    return fingerprint(key, file_hash(mesh_path), MESH_PARSER_VERSION, generator_version(), options or {})
+
+# Directory of a store entry holding its processed mesh, one .npy file per array
+STORE_ARRAYS_DIR = 'mesh_arrays'
+
+def build_store_entry(key, mesh_path, options, store_dir):
+    """Run process_region into store_dir/<store_key> unless that entry already exists, and
+    return the entry directory. The entry's mesh file is a hard link to the one in
+    store_dir/meshes, and the processed mesh is kept alongside in STORE_ARRAYS_DIR. Entries
+    are built in a temporary directory and renamed into place, so concurrent builders of
+    the same entry are safe."""
+    entry = Path(store_dir) / store_key(key, mesh_path, options)
+    if not (entry / STORE_ARRAYS_DIR).is_dir():
+        stored = store_mesh_file(mesh_path, store_dir)
+        tmp = tempfile.mkdtemp(dir=store_dir, prefix='.build-')
+        try:
+            mesh = process_region(key, stored, tmp, options)
+            os.makedirs(os.path.join(tmp, STORE_ARRAYS_DIR))
+            for name, arr in _mesh_to_arrays(mesh).items():
+                np.save(os.path.join(tmp, STORE_ARRAYS_DIR, f'{name}.npy'), arr)
+            os.rename(tmp, entry)
+        except OSError:
+            if not (entry / STORE_ARRAYS_DIR).is_dir():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return entry
+
+def prune_store(store_dir, keep_entries, keep_meshes):
+    """Delete the entries and stored meshes of store_dir that are not listed to be kept."""
+    for path in Path(store_dir).iterdir():
+        if path.name == 'meshes':
+            for mesh in path.iterdir():
+                if mesh.name not in keep_meshes:
+                    mesh.unlink()
+        elif path.name not in keep_entries:
+            shutil.rmtree(path, ignore_errors=True)
+
+def store_entry_outputs(entry):
+    """Paths, relative to the project, of the files _attach_store_entry links from an entry."""
+    paths = []
+    for root, dirs, files in os.walk(entry):
+        if root == str(entry):
+            dirs[:] = [name for name in dirs if name != STORE_ARRAYS_DIR]
+        paths += [os.path.relpath(os.path.join(root, name), entry).replace(os.sep, '/') for name in files]
+    return sorted(paths)
+
+def _attach_store_entry(entry, output_dir):
+    """Link a store entry into output_dir and memory-map its processed mesh."""
+    with profile_stage('link_store_entry'):
+        link_tree(entry, output_dir, skip=(STORE_ARRAYS_DIR,))
+        return _mesh_from_arrays({path.stem: np.load(path, mmap_mode='r') for path in (entry / STORE_ARRAYS_DIR).glob('*.npy')})
+
+def process_regions(mesh_files, output_dir, store_dir, jobs=1, options=None):
+    """Run process_region for every mesh, in a process pool of `jobs` workers when jobs > 1.
+
+    The region outputs are built once per distinct mesh and options in the
+    content-addressed store_dir and hard-linked into output_dir. Processed arrays are
+    memory-mapped read-only from the store entries, so the parent never unpickles or
+    copies the mesh data.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    if jobs <= 1 or len(mesh_files) <= 1:
+        entries = {key: build_store_entry(key, path, options, store_dir) for key, path in mesh_files.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(mesh_files))) as pool:
+            futures = {key: _submit(pool, build_store_entry, key, path, options, store_dir) for key, path in mesh_files.items()}
+            entries = {key: _result(future) for key, future in futures.items()}
+    return {key: _attach_store_entry(entry, output_dir) for key, entry in entries.items()}
+
+def build_region_options(config, fraction_of_pi):
+    """process_region options derived from the configuration."""
+    openfoam_config = config.get('openfoam', {})
+    quality_config = config.get('mesh', {}).get('quality') or {}
+    return {
+        'polymesh_format': openfoam_config.get('polymesh_format', 'ascii'),
+        'decompose_ranks': int(config.get('simulation', {}).get('parallel_ranks', 1)) if openfoam_config.get('decompose', False) else 1,
+        'decomposition_method': openfoam_config.get('decomposition_method', 'auto'),
+        'interface_weight': openfoam_config.get('interface_weight', 0),
+        # Study only fraction_of_pi of the revolution, starting at simulation.sector_start_deg
+        'sector': (float(np.radians(float(config.get('simulation', {}).get('sector_start_deg', 0.0)))), fraction_of_pi * np.pi),
+        'sector_patch_type': config.get('simulation', {}).get('sector_patch_type', 'symmetry'),
+        'renumber': None if str(config.get('mesh', {}).get('renumber')).lower() in ('none', 'false') else config['mesh']['renumber'],
+        'quality': None if quality_config.get('enabled', True) is False else {**MESH_QUALITY_DEFAULTS, **{k: v for k, v in quality_config.items() if k in MESH_QUALITY_DEFAULTS}},
+    }
+
+def generate_project(mesh_files, output_dir, fraction_of_pi=1.0, config_path='config.yaml', combustion=False, jobs=1, store_dir=None, force=False):
+    with profile_stage('load_config'):
+        config = load_config(config_path)
+        config_flat = flatten_config(config)
 
     """
     mesh_files: dict with keys 'solid', 'interior_fluid', 'exterior_fluid', 'cooling_channel_fluid'
     output_dir: path to the generated project
     fraction_of_pi: float, portion of the nozzle to study (e.g., 0.5 for half-pi)
+    jobs: number of worker processes used to process the region meshes
+    store_dir: optional content-addressed store shared by several projects; meshes and
+        mesh-derived files are hard-linked from it instead of being copied and reconverted.
+        Defaults to a store private to the project.
+    force: rebuild every output. Otherwise only outputs whose inputs (templates, referenced
+        config values, meshes, generator version) changed since the last run are rewritten,
+        as recorded in the project's dependency manifest. Outputs of the previous run that
+        this one does not write, such as processor* directories of an older decomposition,
+        are deleted.
     """
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
+    deps = load_dependency_manifest(output_dir, force)
+    private_store = store_dir is None
+    if private_store:
+        store_dir = Path(output_dir) / GENERATOR_STATE_DIR / 'store'
+        if force:
+            shutil.rmtree(store_dir, ignore_errors=True)
 
-    # Copy template files
+    # Copy template files; {{...}} templates are only written when rendered from the compiled manifest below
     template_dir = Path(__file__).parent.parent / 'templates'
-    for item in template_dir.iterdir():
-        if item.is_dir():
-            shutil.copytree(item, Path(output_dir) / item.name, dirs_exist_ok=True)
-        else:
-            shutil.copy2(item, output_dir)
+    manifest = load_template_manifest(template_dir)
+    def skip_rendered(directory, names):
+        rel = Path(directory).relative_to(template_dir)
+        return [name for name in names if (rel / name).as_posix() in manifest]
+    def copy_template(src, dst):
+        rel = Path(dst).relative_to(output_dir).as_posix()
+        if rel.startswith('openfoam/') and Path(rel).parent.name == '0' and Path(rel).name in BOUNDARY_FIELDS:
+            return  # written by write_openfoam_boundaries
+        if not up_to_date(deps, rel, file_hash(src), output_dir):
+            copy_output(src, dst)
+            count('files_copied')
+    with profile_stage('copy_templates'):
+        for item in template_dir.iterdir():
+            if item.is_dir():
+                shutil.copytree(item, Path(output_dir) / item.name, dirs_exist_ok=True, ignore=skip_rendered, copy_function=copy_template)
+            elif item.name not in manifest:
+                copy_template(item, Path(output_dir) / item.name)
 
-    # Copy tools/log.sh to project root for logging in all run.sh scripts
-    tools_dir = template_dir / 'tools'
-    if tools_dir.exists():
-        for item in tools_dir.iterdir():
-            shutil.copy2(item, Path(output_dir) / 'tools' / item.name)
-    else:
+    # tools/log.sh is used for logging in all run.sh scripts
+    if not (template_dir / 'tools').exists():
         os.makedirs(Path(output_dir) / 'tools', exist_ok=True)
         # fallback: create a minimal log.sh if missing
-        with open(Path(output_dir) / 'tools/log.sh', 'w') as f:
-            f.write('#!/usr/bin/env bash\nLOGFILE="log.$(basename $(pwd))"\nclose_log() { echo "Log closed at $(date)" >> "$LOGFILE"; }\n')
+        if not up_to_date(deps, 'tools/log.sh', 'fallback', output_dir):
+            with open_output(Path(output_dir) / 'tools/log.sh', 'w') as f:
+                f.write('#!/usr/bin/env bash\nLOGFILE="log.$(basename $(pwd))"\nclose_log() { echo "Log closed at $(date)" >> "$LOGFILE"; }\n')
 
     # Place mesh and input files in correct locations for CalculiX
-    shutil.copy2(mesh_files['solid'], os.path.join(output_dir, 'calculix/mesh.inp'))
-
-    # Copy CalculiX input template and rename to solid.inp in calculix directory
-    shutil.copy2(template_dir / 'calculix/nozzle.inp', os.path.join(output_dir, 'calculix/solid.inp'))
-    # Fill placeholders in solid.inp
-    replace_in_file(os.path.join(output_dir, 'calculix/solid.inp'), replacements)
-
-    # Place mesh files
-    mesh_map = {
-        'solid': 'calculix/mesh.msh',
-        'interior_fluid': 'openfoam/interior/mesh.msh',
-        'exterior_fluid': 'openfoam/exterior/mesh.msh',
-        'cooling_channel_fluid': 'openfoam/cooling_channel/mesh.msh',
-    }
-    for key, dest in mesh_map.items():
-        if key in mesh_files:
-            dest_path = Path(output_dir) / dest
-            os.makedirs(dest_path.parent, exist_ok=True)
-            shutil.copy2(mesh_files[key], dest_path)
+    def place(src, dst):
+        if not up_to_date(deps, Path(dst).relative_to(output_dir).as_posix(), file_hash(src), output_dir):
+            link_or_copy(store_mesh_file(src, store_dir), dst)
+    place(mesh_files['solid'], Path(output_dir) / 'calculix/mesh.inp')
+
+    # Copy, parse and convert every region mesh (in parallel when jobs > 1); unchanged
+    # regions are linked from the store without being converted again
+    region_options = build_region_options(config, fraction_of_pi)
+    region_keys = {key: store_key(key, path, region_options) for key, path in mesh_files.items()}
+    with profile_stage('process_regions'):
+        meshes = process_regions(mesh_files, output_dir, store_dir, jobs, region_options)
+    unchanged = []
+    for key in mesh_files:
+        entry = Path(store_dir) / region_keys[key]
+        if up_to_date(deps, store_entry_outputs(entry), region_keys[key], output_dir):
+            unchanged.append(key)
+        # A new rank count or decompose setting leaves processor* directories that the new
+        # decomposition does not write; run.sh would run on them instead of decomposing
+        case_rel = Path(MESH_DESTINATIONS[key]).parent
+        keep = {d.name for d in (entry / case_rel).glob('processor*')}
+        for proc_dir in sorted((Path(output_dir) / case_rel).glob('processor*')):
+            if proc_dir.name not in keep:
+                shutil.rmtree(proc_dir)
+                deps['removed'].append(f"{(case_rel / proc_dir.name).as_posix()}/")
+    if unchanged:
+        print("Mesh conversion skipped (inputs unchanged):", ', '.join(unchanged))
 
     # Copy mesh files into generated_project/meshs
     mesh_dir = Path(output_dir) / 'meshs'
     os.makedirs(mesh_dir, exist_ok=True)
-    for key, src in mesh_files.items():
-        dest = mesh_dir / Path(src).name
-        shutil.copy2(src, dest)
-        mesh_files[key] = str(dest)
-
-    # CalculiX mesh automation (GMSH 4.x)
-    nodes, elements, phys_sets = parse_gmsh_mesh_v4(mesh_files['solid'])
-    solid_names = parse_physical_names(mesh_files['solid'])
-    write_calculix_inp(nodes, elements, solid_names, phys_sets, Path(output_dir) / 'calculix/nozzle.inp')
+    stored_meshes = set()
+    with profile_stage('place_meshes'):
+        for key, src in mesh_files.items():
+            dest = mesh_dir / Path(src).name
+            place(src, dest)
+            stored_meshes.add(f"{file_hash(src)}{Path(src).suffix}")
+            mesh_files[key] = str(dest)
+        if private_store:
+            prune_store(store_dir, set(region_keys.values()), stored_meshes)
 
     # Parse mesh boundaries
-    solid_names = parse_physical_names(mesh_files['solid'])
-    inner_names = parse_physical_names(mesh_files['interior_fluid'])
-    outer_names = parse_physical_names(mesh_files['exterior_fluid'])
-    cooling_names = parse_physical_names(mesh_files['cooling_channel_fluid'])
+    solid_names = meshes['solid']['physical_names']
+    inner_names = meshes['interior_fluid']['physical_names']
+    outer_names = meshes['exterior_fluid']['physical_names']
+    cooling_names = meshes['cooling_channel_fluid']['physical_names']
 
     # Example: find all nozzle wall interfaces for FSI
     solid_nozzle_walls = find_interfaces(solid_names, r'Nozzle_Outer_Wall')
@@ -293,93 +2493,167 @@ def generate_project(mesh_files, output_dir, fraction_of_pi=1.0, config_path='co
     print("Detected cooling channel entries:", cooling_entries)
     print("Detected cooling channel exits:", cooling_exits)
 
-    # Prepare replacements for placeholders
-    replacements = {
-        '{{MESH_PATH}}': mesh_files['solid'],
-        '{{INTERIOR_MESH}}': mesh_files['interior_fluid'],
-        '{{EXTERIOR_MESH}}': mesh_files['exterior_fluid'],
-        '{{COOLING_MESH}}': mesh_files['cooling_channel_fluid'],
-        '{{SOLID_MESH}}': mesh_files['solid'],
-        '{{FRACTION_OF_PI}}': str(fraction_of_pi),
+    # Prepare values for the {{...}} template placeholders
+    values = {
+        'MESH_PATH': mesh_files['solid'],
+        'INTERIOR_MESH': mesh_files['interior_fluid'],
+        'EXTERIOR_MESH': mesh_files['exterior_fluid'],
+        'COOLING_MESH': mesh_files['cooling_channel_fluid'],
+        'SOLID_MESH': mesh_files['solid'],
+        'FRACTION_OF_PI': str(fraction_of_pi),
     }
-    # Ensure cooling_solver is set in replacements before any replacements are made
+    # Ensure cooling_solver is set before any template is rendered
     cooling_solver = config.get('simulation', {}).get('cooling_solver')
     if not cooling_solver:
         if combustion:
             cooling_solver = config.get('simulation', {}).get('reacting_solver', 'reactingFoam')
         else:
             cooling_solver = config.get('simulation', {}).get('solver', 'rhoCentralFoam')
-    replacements['{{simulation.cooling_solver}}'] = cooling_solver
-    # Example: use first detected wall for coupling
-    if solid_nozzle_walls:
-        replacements['NOZZLE_WALL'] = solid_nozzle_walls[0]
-    if cooling_entries:
-        replacements['COOLING_WALL'] = cooling_entries[0]
+    values['simulation.cooling_solver'] = cooling_solver
 
     # Detect interface names for PreCICE XML
     # These should be the patch/physical names at the fluid-solid interface for each region
     # For this example, use the first matching interface for each region
     # (You may want to improve this logic for multi-channel or multi-patch cases)
     interface_names = {
-        'INTERIOR_INTERFACE': find_interfaces(inner_names, r'Inner_Fluid_Outer_Wall')[0] if find_interfaces(inner_names, r'Inner_Fluid_Outer_Wall') else 'MISSING_INTERIOR_INTERFACE',
-        'EXTERIOR_INTERFACE': find_interfaces(outer_names, r'Nozzle_Outer_Wall')[0] if find_interfaces(outer_names, r'Nozzle_Outer_Wall') else 'MISSING_EXTERIOR_INTERFACE',
-        'COOLING_INTERFACE': find_interfaces(cooling_names, r'Cooling_Channel_\d+_Entry_Wall')[0] if find_interfaces(cooling_names, r'Cooling_Channel_\d+_Entry_Wall') else 'MISSING_COOLING_INTERFACE',
-        'SOLID_INTERFACE': find_interfaces(solid_names, r'Nozzle_Outer_Wall')[0] if find_interfaces(solid_names, r'Nozzle_Outer_Wall') else 'MISSING_SOLID_INTERFACE',
+        'INTERIOR_INTERFACE': find_interfaces(inner_names, INTERFACE_PATTERNS['interior_fluid'])[0] if find_interfaces(inner_names, INTERFACE_PATTERNS['interior_fluid']) else 'MISSING_INTERIOR_INTERFACE',
+        'EXTERIOR_INTERFACE': find_interfaces(outer_names, INTERFACE_PATTERNS['exterior_fluid'])[0] if find_interfaces(outer_names, INTERFACE_PATTERNS['exterior_fluid']) else 'MISSING_EXTERIOR_INTERFACE',
+        'COOLING_INTERFACE': find_interfaces(cooling_names, INTERFACE_PATTERNS['cooling_channel_fluid'])[0] if find_interfaces(cooling_names, INTERFACE_PATTERNS['cooling_channel_fluid']) else 'MISSING_COOLING_INTERFACE',
+        'SOLID_INTERFACE': find_interfaces(solid_names, INTERFACE_PATTERNS['solid'])[0] if find_interfaces(solid_names, INTERFACE_PATTERNS['solid']) else 'MISSING_SOLID_INTERFACE',
     }
-    # Add these to replacements for PreCICE XML
-    for k, v in interface_names.items():
-        replacements[f'{{{{{k}}}}}'] = v
-
-    # Merge config values into replacements
-    replacements.update({f'{{{{{k}}}}}': v for k, v in config_flat.items()})
-    # Replace in all OpenFOAM files recursively
-    for region in ['interior', 'exterior', 'cooling_channel']:
-        replace_in_dir(os.path.join(output_dir, f'openfoam/{region}'), replacements)
-    # Replace in CalculiX, OpenFOAM, and PreCICE config files
-    replace_in_file(Path(output_dir) / 'calculix/nozzle.inp', replacements)
-    replace_in_file(Path(output_dir) / 'openfoam/interior/README.txt', replacements)
-    replace_in_file(Path(output_dir) / 'openfoam/exterior/README.txt', replacements)
-    replace_in_file(Path(output_dir) / 'openfoam/cooling_channel/README.txt', replacements)
-    replace_in_file(Path(output_dir) / 'precice/precice-config.xml', replacements)
+    # Add these to the values for PreCICE XML
+    values.update(interface_names)
+
+    # Merge config values into the template values
+    values.update(config_flat)
 
     # --- Combustion logic ---
-    # If combustion is enabled, set solver and copy chemistry/species files for reactingFoam
+    # If combustion is enabled, set solver and render chemistry/species files for reactingFoam
+    # calculix/nozzle.inp is the generated mesh deck; its template is rendered as solid.inp
+    targets = {'calculix/nozzle.inp': ['calculix/solid.inp']}
+    if region_options['decompose_ranks'] > 1:
+        # Pre-decomposed cases keep the decomposeParDict written with their processor* directories
+        for region in ['interior', 'exterior', 'cooling_channel']:
+            targets[f'openfoam/{region}/system/decomposeParDict'] = []
     if combustion:
         print("[INFO] Generating a combustion (reacting flow) project...")
-        # Overwrite solver in replacements
-        replacements['{{simulation.solver}}'] = config.get('simulation', {}).get('reacting_solver', 'reactingFoam')
+        values['simulation.solver'] = config.get('simulation', {}).get('reacting_solver', 'reactingFoam')
         # Copy all combustion-specific files from templates/openfoam/interior/combustion
         combustion_template_dir = template_dir / 'openfoam/interior/combustion'
         combustion_target_dir = Path(output_dir) / 'openfoam/interior'
         if combustion_template_dir.exists():
             for item in combustion_template_dir.iterdir():
-                shutil.copy2(item, combustion_target_dir / item.name)
-        # Replace placeholders in all new combustion files
-        for item in combustion_template_dir.iterdir():
-            target_file = combustion_target_dir / item.name
-            if target_file.is_file():
-                replace_in_file(target_file, replacements)
+                rel = item.relative_to(template_dir).as_posix()
+                if rel in manifest:
+                    targets[rel] = [rel, f'openfoam/interior/{item.name}']
+                else:
+                    copy_template(item, combustion_target_dir / item.name)
     else:
         print("[INFO] Generating a non-combustion (standard CHT) project...")
-        replacements['{{simulation.solver}}'] = config.get('simulation', {}).get('solver', 'rhoCentralFoam')
+        values['simulation.solver'] = config.get('simulation', {}).get('solver', 'rhoCentralFoam')
+    # Fill every template in one pass per file, collecting unresolved placeholders for validation
+    with profile_stage('render_templates'):
+        unresolved = render_templates(manifest, output_dir, values, targets, deps)
 
     # Example: collect FSI interface names
     fsi_patches = list(set(solid_nozzle_walls + outer_nozzle_walls + cooling_entries))
-    # Write OpenFOAM boundary files for all regions
-    for region in ['interior', 'exterior', 'cooling_channel']:
-        write_openfoam_boundaries(output_dir, region, fsi_patches)
-    # Write CalculiX surfaces for FSI
-    # (Assume fsi_sets is a dict {name: [elem_ids]})
-    # with open(Path(output_dir) / 'calculix/nozzle.inp', 'a') as f:
-    #     write_calculix_surfaces(f, fsi_sets)
+    # Write OpenFOAM boundary files for all regions, listing the patches of each region's polyMesh
+    with profile_stage('write_openfoam_boundaries'):
+        for region in ['interior', 'exterior', 'cooling_channel']:
+            case_dir = Path(output_dir) / f'openfoam/{region}'
+            polymesh_dir = case_dir / 'constant/polyMesh'
+            if (polymesh_dir / 'boundary').is_file():
+                patch_types = read_polymesh_patch_types(polymesh_dir)
+                patches = (list(patch_types), {name: t for name, t in patch_types.items() if t != 'patch'})
+            else:
+                patches = (fsi_patches, None)
+            fields = [(d.relative_to(output_dir) / '0' / field).as_posix() for d in [case_dir, *sorted(case_dir.glob('processor*'))] for field in BOUNDARY_FIELDS]
+            if not up_to_date(deps, fields, fingerprint(*patches), output_dir):
+                write_openfoam_boundaries(output_dir, region, *patches)
     # Update PreCICE XML with interface names
     update_precice_xml_interfaces(os.path.join(output_dir, 'precice/precice-config.xml'), fsi_patches)
 
+    remove_stale_outputs(output_dir, deps)
+    save_dependency_manifest(output_dir, deps)
+    print(format_skip_report(deps), end='')
     print(f"Project generated at {output_dir}. All files and meshes are included and ready to use.")
     # Validation step
-    validate_generated_project(output_dir, mesh_files)
+    with profile_stage('validate_generated_project'):
+        validate_generated_project(output_dir, mesh_files, meshes, unresolved)
+
+# Sweep parameters passed to generate_project itself; every other parameter is a dotted config key
+SWEEP_ARGUMENTS = ('fraction_of_pi', 'combustion')
+
+def set_config_value(config, dotted_key, value):
+    """Set config['a']['b']['c'] = value for dotted_key 'a.b.c', creating sections as needed."""
+    *sections, leaf = dotted_key.split('.')
+    for section in sections:
+        config = config.setdefault(section, {})
+    config[leaf] = value
+
+def expand_sweep(parameters):
+    """Cartesian product of {parameter: [values]} as a list of {parameter: value} dicts."""
+    names = list(parameters)
+    values = [v if isinstance(v, list) else [v] for v in parameters.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+def run_sweep(sweep_path, jobs=1, force=False):
+    """Generate one project per point of the parameter grid of a sweep file.
+
+    The sweep file (YAML) holds `config` (base config.yaml), `output_dir`, optional `meshes`
+    ({region: path}) and `parameters` ({dotted config key or fraction_of_pi/combustion:
+    [values]}). Case i is generated in <output_dir>/case_<i> with its own config.yaml, and
+    <output_dir>/sweep_cases.json lists the parameters of every case. Region meshes are
+    converted once per distinct mesh and region options into <output_dir>/.store and
+    hard-linked into the cases, so conversion time and mesh disk usage follow the number of
+    distinct meshes rather than the number of cases. Cases run in `jobs` worker processes and
+    are regenerated incrementally unless force is set.
+    """
+    with open(sweep_path, 'r') as f:
+        sweep = yaml.safe_load(f) or {}
+    base_config = load_config(sweep.get('config', 'config.yaml'))
+    mesh_files = sweep.get('meshes') or DEFAULT_MESH_FILES
+    output_root = Path(sweep.get('output_dir', 'sweep'))
+    store_dir = output_root / '.store'
+    os.makedirs(store_dir, exist_ok=True)
+
+    cases = []
+    for index, point in enumerate(expand_sweep(sweep.get('parameters') or {})):
+        config = copy.deepcopy(base_config)
+        arguments = {'fraction_of_pi': float(config.get('simulation', {}).get('fraction_of_pi', 1.0)),
+                     'combustion': bool(config.get('simulation', {}).get('combustion', False))}
+        for name, value in point.items():
+            if name in SWEEP_ARGUMENTS:
+                arguments[name] = value
+            else:
+                set_config_value(config, name, value)
+        case_dir = output_root / f'case_{index:03d}'
+        os.makedirs(case_dir, exist_ok=True)
+        with open_output(case_dir / 'config.yaml', 'w') as f:
+            yaml.safe_dump(config, f, sort_keys=False)
+        cases.append({'case': case_dir.name, 'parameters': point, 'config': config, **arguments})
+
+    # Build every distinct store entry first, so cases only link them
+    entries = {}
+    for case in cases:
+        options = build_region_options(case['config'], case['fraction_of_pi'])
+        for key, path in mesh_files.items():
+            entries.setdefault(store_key(key, path, options), (key, path, options, store_dir))
+    print(f"Sweep {sweep_path}: {len(cases)} cases, {len(entries)} distinct region meshes")
+    run = lambda pool, fn, calls: [_result(f) for f in [_submit(pool, fn, *c) for c in calls]] if pool else [fn(*c) for c in calls]
+    case_calls = [(dict(mesh_files), str(output_root / case['case']), case['fraction_of_pi'],
+                   str(output_root / case['case'] / 'config.yaml'), case['combustion'], 1, str(store_dir), force) for case in cases]
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else contextlib.nullcontext() as pool:
+        with profile_stage('build_store_entries'):
+            run(pool, build_store_entry, entries.values())
+        with profile_stage('generate_cases'):
+            run(pool, generate_project, case_calls)
 
-def cli_wizard():
+    with open_output(output_root / 'sweep_cases.json', 'w') as f:
+        json.dump([{k: case[k] for k in ('case', 'parameters', *SWEEP_ARGUMENTS)} for case in cases], f, indent=2)
+    print(f"Sweep generated {len(cases)} cases in {output_root}")
+
+def cli_wizard(jobs=1, force=False):
     print("\n==== PreCICE Nozzle Project Generator ====")
     print("You can use default mesh file names or specify your own.")
     mesh_files = {}
@@ -396,16 +2670,146 @@ def cli_wizard():
     combustion_choice = input("Enable combustion (reacting flow)? [y/N]: ").strip().lower()
     combustion = combustion_choice == 'y'
     # Pass combustion as an override to the config
-    generate_project(mesh_files, out_dir, fraction_of_pi=frac, config_path=config_path, combustion=combustion)
+    generate_project(mesh_files, out_dir, fraction_of_pi=frac, config_path=config_path, combustion=combustion, jobs=jobs, force=force)
+
+# Share of the vertices of each coupled patch that must lie on the other one
+INTERFACE_MIN_COVERAGE = 0.99
+# Support radius of compact RBF mappings, in vertex spacings, assumed by mapping_memory
+RBF_SUPPORT_SPACINGS = 3.0
+PRECICE_MAPPINGS = ('nearest-neighbor', 'nearest-projection', 'rbf-compact-polynomial-c2', 'rbf-thin-plate-splines')
+
+def interface_patch(mesh, name):
+    """Node coordinates of the physical surface `name` and its mean triangle edge length
+    (empty points when the mesh has no such surface)."""
+    ids = [phys_id for phys_id, n in mesh['physical_names'].items() if n == name]
+    tags = mesh['phys_sets'].get(ids[0], []) if ids else []
+    conn = [b['conn'][np.isin(b['tags'], tags)] for t, b in mesh['elements'].items() if t in GMSH_TRI_TYPES]
+    conn = [c for c in conn if len(c)]
+    if not conn:
+        return np.empty((0, 3)), 0.0
+    coords = mesh['nodes']['coords']
+    node_tags = np.unique(np.concatenate([c.ravel() for c in conn]))
+    corners = np.concatenate([c[:, :3] for c in conn])
+    p = coords[node_index(mesh['nodes'], corners.ravel())].reshape(-1, 3, 3)
+    spacing = np.linalg.norm(p - np.roll(p, 1, axis=1), axis=2).mean()
+    return coords[node_index(mesh['nodes'], node_tags)], float(spacing)
+
+def nearest_distances(source, target):
+    """Distance from every target point to the nearest source point, through a scipy
+    cKDTree when scipy is installed, else a chunked brute-force search."""
+    if not len(source):
+        return np.full(len(target), np.inf)
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        dist = np.empty(len(target))
+        step = max(GEOMETRY_CHUNK // len(source), 1)
+        for i in range(0, len(target), step):
+            d2 = ((target[i:i + step, None, :] - source[None, :, :]) ** 2).sum(axis=2)
+            dist[i:i + step] = np.sqrt(d2.min(axis=1))
+        return dist
+    return cKDTree(source).query(target)[0]
 
-def validate_generated_project(output_dir, mesh_files):
+def mapping_memory(mapping, n_from, n_to):
+    """Rough memory in bytes of a preCICE mapping from n_from to n_to vertices.
+
+    Nearest-neighbor keeps a search tree and one index per output vertex, nearest-projection
+    adds the source triangles and three weights per output vertex. Compact RBFs store about
+    pi * RBF_SUPPORT_SPACINGS**2 entries per vertex row of their sparse system and evaluation
+    matrices; global RBFs are dense.
+    """
+    if mapping.startswith('rbf'):
+        if 'compact' in mapping:
+            return 12 * np.pi * RBF_SUPPORT_SPACINGS ** 2 * (n_from + n_to)
+        n = n_from + 4  # interpolant plus the linear polynomial
+        return 8 * n * (n + n_to)
+    if mapping == 'nearest-projection':
+        return 64 * n_from + 36 * n_to
+    return 40 * n_from + 8 * n_to
+
+def _format_bytes(n):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.3g} {unit}" if unit != 'B' else f"{int(n)} B"
+        n /= 1024
+
+def interface_pair_check(source, target, mapping):
+    """Gap statistics, coverage and mapping memory between two coupled patches, each given
+    as (points, spacing) by interface_patch. A vertex is covered when the other patch has
+    a vertex within two spacings of the coarser patch; mappings are costed both ways."""
+    (src, h_src), (tgt, h_tgt) = source, target
+    tol = 2.0 * max(h_src, h_tgt)
+    gaps = {'target': nearest_distances(src, tgt), 'source': nearest_distances(tgt, src)}
+    check = {'vertices': (len(src), len(tgt)), 'spacing': (h_src, h_tgt), 'tolerance': tol, 'mapping': mapping}
+    for side, d in gaps.items():
+        check[f'{side}_gap'] = tuple(np.percentile(d, [50, 95, 100]))
+        check[f'{side}_coverage'] = float(np.mean(d <= tol))
+    check['memory'] = {m: mapping_memory(m, len(src), len(tgt)) + mapping_memory(m, len(tgt), len(src))
+                       for m in dict.fromkeys(PRECICE_MAPPINGS + (mapping,))}
+    # Coincident vertices make nearest-neighbor exact; otherwise a global RBF can usually be
+    # swapped for a compact one at a fraction of the cost
+    conforming = max(check['target_gap'][2], check['source_gap'][2]) <= 1e-6 * max(tol, 1e-300)
+    cheaper = 'nearest-neighbor' if conforming else 'rbf-compact-polynomial-c2' if mapping.startswith('rbf') and 'compact' not in mapping else None
+    if cheaper and cheaper != mapping and check['memory'][cheaper] < check['memory'][mapping]:
+        check['suggestion'] = cheaper
+    return check
+
+def format_interface_check(name_from, name_to, check):
+    """Render an interface_pair_check as an indented report block."""
+    fmt = lambda values: ' / '.join(f'{v:.3g}' for v in values)
+    lines = [f"Interface {name_from} -> {name_to} ({check['mapping']})",
+             f"  vertices            {check['vertices'][0]} -> {check['vertices'][1]}",
+             f"  vertex spacing      {fmt(check['spacing'])} (coverage tolerance {check['tolerance']:.3g})",
+             f"  target gap          {fmt(check['target_gap'])} (median / p95 / max)",
+             f"  source gap          {fmt(check['source_gap'])} (median / p95 / max)",
+             f"  coverage            {100 * check['target_coverage']:.1f}% of target, {100 * check['source_coverage']:.1f}% of source vertices",
+             "  mapping memory      " + ', '.join(f"{m} {_format_bytes(b)}" for m, b in check['memory'].items())]
+    if 'suggestion' in check:
+        m = check['suggestion']
+        lines.append(f"  suggestion          {m} needs {_format_bytes(check['memory'][m])} instead of {_format_bytes(check['memory'][check['mapping']])}"
+                     + (" and is exact on coincident vertices" if m == 'nearest-neighbor' else ""))
+    return '\n'.join(lines) + '\n'
+
+def check_interface_mappings(xml_path, meshes):
+    """Pre-flight check of every <mapping> of precice-config.xml against the parsed meshes.
+
+    Each mesh name is looked up among the physical surfaces of the regions (from and to in
+    different regions when a name exists in several). Returns (report text, errors); errors
+    list missing patches and patches that do not cover each other.
+    """
+    with open(xml_path, 'r') as f:
+        mappings = [dict(re.findall(r'([\w-]+)="([^"]*)"', attrs)) for attrs in re.findall(r'<mapping\b([^>]*)>', f.read())]
+    report, errors = [], []
+    for mapping in mappings:
+        name_from, name_to = mapping.get('from'), mapping.get('to')
+        regions = {name: [key for key, mesh in meshes.items() if name in mesh['physical_names'].values()] for name in (name_from, name_to)}
+        pair = next(((a, b) for a in regions[name_from] for b in regions[name_to] if a != b), None)
+        if pair is None:
+            errors.append(f"Cannot check mapping {name_from} -> {name_to}: " + ' and '.join(n for n in (name_from, name_to) if not regions[n]) + " not found in the meshes")
+            continue
+        patches = [interface_patch(meshes[key], name) for key, name in zip(pair, (name_from, name_to))]
+        empty = [f"{name} ({key})" for key, name, patch in zip(pair, (name_from, name_to), patches) if not len(patch[0])]
+        if empty:
+            errors.append(f"Cannot check mapping {name_from} -> {name_to}: " + ' and '.join(empty) + " has no surface elements")
+            continue
+        check = interface_pair_check(*patches, mapping.get('type', 'nearest-neighbor'))
+        report.append(format_interface_check(f"{pair[0]}:{name_from}", f"{pair[1]}:{name_to}", check))
+        for side, name in (('target', name_to), ('source', name_from)):
+            if check[f'{side}_coverage'] < INTERFACE_MIN_COVERAGE:
+                errors.append(f"Interface {name_from} -> {name_to}: only {100 * check[f'{side}_coverage']:.1f}% of the {name} vertices lie within {check['tolerance']:.3g} of the other patch")
+    return ''.join(report), errors
+
+def validate_generated_project(output_dir, mesh_files, meshes=None, unresolved=None):
     """
     Validate the generated project for:
     1. Missing required files
     2. Unreplaced placeholders
     3. Mesh/interface consistency
+    4. Geometric matching of the coupled interfaces (written to precice/interface_check.txt)
+
+    meshes: optional {key: parsed mesh} from load_mesh, reused instead of re-reading mesh_files
+    unresolved: {output path: token names} reported by render_templates
     """
-    import fnmatch
     errors = []
     # 1. Check for required files
     required_files = [
@@ -421,16 +2825,9 @@ def validate_generated_project(output_dir, mesh_files):
     for f in required_files:
         if not os.path.isfile(os.path.join(output_dir, f)):
             errors.append(f"Missing required file: {f}")
-    # 2. Scan for unreplaced placeholders
-    for root, _, files in os.walk(output_dir):
-        for file in files:
-            if fnmatch.fnmatch(file, '*.msh'):
-                continue  # skip mesh files
-            path = os.path.join(root, file)
-            with open(path, 'r', errors='ignore') as f:
-                content = f.read()
-                if re.search(r'\{\{.*?\}\}', content):
-                    errors.append(f"Unreplaced placeholder in {path}")
+    # 2. Unreplaced placeholders, as collected while rendering the templates
+    for path, names in (unresolved or {}).items():
+        errors.append(f"Unreplaced placeholder in {os.path.join(output_dir, path)}: " + ', '.join(f'{{{{{n}}}}}' for n in names))
     # 3. Mesh/interface consistency (example: check PreCICE XML for interface names)
     precice_xml = os.path.join(output_dir, 'precice/precice-config.xml')
     if os.path.isfile(precice_xml):
@@ -439,12 +2836,20 @@ def validate_generated_project(output_dir, mesh_files):
         # Find all interface names in XML (e.g., <mesh name="...">)
         interface_names = re.findall(r'<mesh name="([^"]+)"', xml_content)
         # Check that these names exist in at least one mesh physical name
+        region_meshes = {key: meshes[key] if meshes and key in meshes else load_mesh(mesh_path) for key, mesh_path in mesh_files.items()}
         mesh_phys_names = []
-        for mesh_path in mesh_files.values():
-            mesh_phys_names.extend(parse_physical_names(mesh_path).values())
+        for mesh in region_meshes.values():
+            mesh_phys_names.extend(mesh['physical_names'].values())
         for name in interface_names:
             if name not in mesh_phys_names:
                 errors.append(f"Interface '{name}' in PreCICE XML not found in any mesh physical names.")
+        # 4. Pre-flight interface matching, so mapping problems show up before the job is submitted
+        with profile_stage('check_interface_mappings'):
+            report, interface_errors = check_interface_mappings(precice_xml, region_meshes)
+        with open_output(os.path.join(output_dir, 'precice/interface_check.txt'), 'w') as f:
+            f.write(report)
+        print(report, end='')
+        errors.extend(interface_errors)
     if errors:
         print("\nVALIDATION ERRORS DETECTED:")
         for err in errors:
@@ -454,15 +2859,26 @@ def validate_generated_project(output_dir, mesh_files):
         print("\nValidation successful: All required files and interfaces are present, and no unreplaced placeholders found.")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == '--wizard':
-        cli_wizard()
+    parser = argparse.ArgumentParser(description="Generate a PreCICE nozzle project from GMSH meshes.")
+    parser.add_argument('--wizard', action='store_true', help="prompt for mesh paths and options")
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes used to process the region meshes, or the sweep cases (default: 1)")
+    parser.add_argument('--sweep', metavar='SWEEP_YAML', help="generate every case of a parameter sweep file (see sweep.yaml)")
+    parser.add_argument('--force', action='store_true', help="rebuild every output instead of only those whose inputs changed")
+    parser.add_argument('--profile', nargs='?', const='generator_profile.json', metavar='JSON',
+                        help="record per-stage time, memory peaks and counters, print a summary and write them as a Chrome trace (default: generator_profile.json)")
+    parser.add_argument('--profile-stage', metavar='STAGE', help="with --profile, also run this stage (e.g. parse_gmsh_mesh_v4) under cProfile")
+    args = parser.parse_args()
+    if args.profile_stage and not args.profile:
+        args.profile = 'generator_profile.json'
+    if args.profile:
+        enable_profiling(args.profile_stage)
+    if args.wizard:
+        cli_wizard(jobs=args.jobs, force=args.force)
+    elif args.sweep:
+        run_sweep(args.sweep, jobs=args.jobs, force=args.force)
     else:
         # Automatically detect mesh files in the meshs/ directory
-        mesh_files = {
-            'solid': 'meshs/Solid_mesh.msh',
-            'interior_fluid': 'meshs/Inner_Fluid_mesh.msh',
-            'exterior_fluid': 'meshs/Outer_Fluid_mesh.msh',
-            'cooling_channel_fluid': 'meshs/Cooling_Channels_mesh.msh',
-        }
-        generate_project(mesh_files, 'generated_project', fraction_of_pi=0.5)
-        validate_generated_project('generated_project', mesh_files)
+        generate_project(dict(DEFAULT_MESH_FILES), 'generated_project', fraction_of_pi=0.5, jobs=args.jobs, force=args.force)
+    if args.profile:
+        print(format_profile_summary(), end='')
+        write_profile(args.profile)
@@ -9,7 +9,8 @@ if [ ! -f mesh.inp ]; then
     exit 1
 fi
 
-export CCX_NPROC_EQUATION_SOLVER=1
+export CCX_NPROC_EQUATION_SOLVER={{calculix.threads}}
+export OMP_NUM_THREADS={{calculix.threads}}
 ccx_preCICE -i solid -precice-participant Solid
 
 close_log
@@ -4,16 +4,17 @@ set -e -u
 . ../../tools/log.sh
 exec > >(tee --append "$LOGFILE") 2>&1
 
-if [ ! -f mesh.msh ]; then
-    echo "Mesh file mesh.msh not found. Please ensure the mesh is present."
+# constant/polyMesh is written by the generator from mesh.msh (no blockMesh/gmshToFoam step)
+if [ ! -f constant/polyMesh/faces ]; then
+    echo "Mesh constant/polyMesh not found. Please regenerate the project."
     exit 1
 fi
 
-blockMesh
-# Add mesh conversion if needed
-
-decomposePar
-mpirun -np 4 preciceAdapterFunctionObject -case . -participant FluidCooling
+# processor* directories are written by the generator when openfoam.decompose is set
+if [ ! -d processor0 ]; then
+    decomposePar
+fi
+mpirun -np {{simulation.parallel_ranks}} preciceAdapterFunctionObject -case . -participant FluidCooling
 reconstructPar
 
 close_log
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'scripts'))
+import precice_nozzle_generator as gen  # noqa: E402
+
+
+def patch_points(mesh, name):
+    """Coordinates of every node of the triangles in physical surface name."""
+    phys_id = next(i for i, n in mesh['physical_names'].items() if n == name)
+    tags = mesh['phys_sets'][phys_id]
+    conn = [block['conn'][np.isin(block['tags'], tags)].ravel()
+            for t, block in mesh['elements'].items() if t in gen.GMSH_TRI_TYPES]
+    return mesh['nodes']['coords'][gen.node_index(mesh['nodes'], np.unique(np.concatenate(conn)))]
+
+
+@pytest.mark.parametrize('mesh_file, start_deg, width_deg', [
+    ('Solid_mesh.msh', -4.5, 9.0),
+    ('Inner_Fluid_mesh.msh', 4.5, 9.0),
+    ('Inner_Fluid_mesh.msh', 2.0, 5.0),
+])
+def test_crop_sector_cut_patches_are_planar(mesh_file, start_deg, width_deg):
+    mesh = gen.load_mesh(str(ROOT / 'meshs' / mesh_file))
+    start, width = np.radians(start_deg), np.radians(width_deg)
+    cropped = gen.crop_sector(mesh, start, width)
+
+    for name, angle in zip(gen.SECTOR_PATCHES, (start, start + width)):
+        points = patch_points(cropped, name)
+        assert len(points)
+        radius = np.hypot(points[:, 1], points[:, 2])
+        deviation = np.abs(np.mod(gen.polar_angle(points) - angle + np.pi, 2 * np.pi) - np.pi)
+        assert deviation[radius > 1e-9 * radius.max()].max() < 1e-9
+    # Rotating the start patch by the sector angle lands it on the end plane
+    rotated = gen.rotate_about_axis({'nodes': {'coords': patch_points(cropped, gen.SECTOR_PATCHES[0])}}, width)
+    assert np.abs(gen._plane_offset(rotated['nodes']['coords'], start + width)).max() < 1e-12
+
+    conn = gen.node_index(cropped['nodes'], cropped['elements'][4]['conn'])
+    assert (gen.tet_signed_volumes(cropped['nodes']['coords'], conn) > 0).all()
+    first, span = gen.angular_range(cropped['nodes']['coords'])
+    assert span <= width + 1e-9
+
+
+def test_crop_sector_rotates_a_narrower_mesh_into_the_window():
+    mesh = gen.load_mesh(str(ROOT / 'meshs' / 'Inner_Fluid_mesh.msh'))  # spans 0 to 18 degrees
+    width = np.radians(18.0)
+    cropped = gen.crop_sector(mesh, -width, width)
+    assert len(cropped['nodes']['coords']) == len(mesh['nodes']['coords'])
+    first, span = gen.angular_range(cropped['nodes']['coords'])
+    assert np.isclose(first, -width)